@@ -0,0 +1,297 @@
+# api_odds_cliente.py
+"""
+Cliente HTTP compartido para The Odds API.
+
+Todos los módulos api_odds* y mercados_validos pasan por aquí:
+  - una sesión requests con pool keep-alive (sin handshake TCP+TLS por llamada)
+  - respuestas comprimidas (gzip)
+  - rate limit con token bucket, seguro entre hilos
+  - reintentos con backoff exponencial en 429/5xx y errores de red
+  - lectura en streaming de respuestas grandes (iter_json): cada evento se
+    entrega según se descarga, sin tener la respuesta entera en memoria
+  - modo grabación (ODDS_GRABAR_DIR): cada respuesta se guarda tal cual
+    para reproducirla luego con servidor_odds_local --modo replay
+  - cuota en vivo desde x-requests-remaining / x-requests-used; si la
+    siguiente llamada dejaría la cuota por debajo de la reserva se lanza
+    QuotaAgotada para que el escaneo pare limpio. El coste de las llamadas
+    en vuelo queda apartado hasta que sus cabeceras actualizan la cuota, así
+    que las llamadas concurrentes no pasan todas el mismo control.
+"""
+import os, time, random, threading, codecs, json, tempfile, requests
+from requests.adapters import HTTPAdapter
+from json_incremental import LectorArrayJSON
+import metricas
+
+API_KEY = os.getenv("ODDS_API_KEY")
+BASE_URL = os.getenv("ODDS_BASE_URL", "https://api.the-odds-api.com/v4")
+POOL_SIZE = int(os.getenv("ODDS_POOL_SIZE", "16"))
+RATE_PER_SEC = float(os.getenv("ODDS_RATE_PER_SEC", "5"))  # llamadas/seg sostenidas
+RATE_BURST = int(os.getenv("ODDS_RATE_BURST", "10"))
+MAX_RETRIES = int(os.getenv("ODDS_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("ODDS_BACKOFF_BASE", "0.5"))  # seg, se dobla en cada intento
+BACKOFF_MAX = float(os.getenv("ODDS_BACKOFF_MAX", "20"))
+QUOTA_RESERVA = int(os.getenv("ODDS_QUOTA_RESERVA", "20"))  # créditos que nunca se gastan
+STREAM_CHUNK = int(os.getenv("ODDS_STREAM_CHUNK", "65536"))  # bytes por lectura en streaming
+GRABAR_DIR = os.getenv("ODDS_GRABAR_DIR", "")  # "" = no grabar
+
+_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class QuotaAgotada(Exception):
+    """La cuota restante no cubre la siguiente llamada (más la reserva)."""
+
+
+class Grabadora:
+    """
+    Guarda respuestas en `directorio`: el cuerpo en NNNNNN.json y una línea
+    por respuesta en indice.jsonl (ts, ruta, params sin apiKey, status,
+    cabeceras de cuota/Retry-After, fichero). Es lo que sirve
+    servidor_odds_local en modo replay, en el mismo orden.
+    """
+    CABECERAS = ("x-requests-remaining", "x-requests-used", "x-requests-last", "Retry-After")
+
+    def __init__(self, directorio):
+        self.dir = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self.lock = threading.Lock()
+        with open(os.path.join(directorio, "indice.jsonl"), "a+") as f:
+            f.seek(0)
+            self.n = sum(1 for _ in f)
+
+    def abrir(self, path, params, resp):
+        """Fichero temporal donde ir escribiendo el cuerpo; cerrar() lo registra."""
+        fd, tmp = tempfile.mkstemp(prefix=".grab-", dir=self.dir)
+        return _Grabacion(self, os.fdopen(fd, "wb"), tmp, path, params, resp)
+
+    def _registrar(self, tmp, path, params, resp):
+        with self.lock:
+            self.n += 1
+            fichero = f"{self.n:06d}.json"
+            os.replace(tmp, os.path.join(self.dir, fichero))
+            linea = {
+                "ts": time.time(),
+                "ruta": "/" + path.strip("/"),
+                "params": {k: v for k, v in params.items() if k != "apiKey"},
+                "status": resp.status_code,
+                "cabeceras": {h: resp.headers[h] for h in self.CABECERAS if h in resp.headers},
+                "fichero": fichero,
+            }
+            with open(os.path.join(self.dir, "indice.jsonl"), "a") as f:
+                f.write(json.dumps(linea) + "\n")
+
+
+class _Grabacion:
+    def __init__(self, grab, f, tmp, path, params, resp):
+        self.grab, self.f, self.tmp = grab, f, tmp
+        self.path, self.params, self.resp = path, params, resp
+
+    def write(self, datos):
+        self.f.write(datos)
+
+    def cerrar(self, completa=True):
+        self.f.close()
+        if completa:
+            self.grab._registrar(self.tmp, self.path, self.params, self.resp)
+        else:
+            os.unlink(self.tmp)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.t = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.t) * self.rate)
+                self.t = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                espera = (1.0 - self.tokens) / self.rate
+            time.sleep(espera)
+
+
+class ClienteOdds:
+    def __init__(self, base_url=BASE_URL, api_key=API_KEY, grabar_dir=GRABAR_DIR):
+        self.base_url = base_url.rstrip("/")
+        self.grabadora = Grabadora(grabar_dir) if grabar_dir else None
+        self.api_key = api_key
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        self.bucket = TokenBucket(RATE_PER_SEC, RATE_BURST)
+        self.lock = threading.Lock()
+        self.remaining = None  # None = aún no sabemos
+        self.en_vuelo = 0      # créditos apartados por llamadas aún sin respuesta
+        self.used = None
+        self.last_cost = None
+
+    # ---- cuota ----
+    def _actualizar_quota(self, resp, liberar=0):
+        """Cuota desde las cabeceras; `liberar` suelta a la vez lo apartado para esta llamada."""
+        h = resp.headers
+        with self.lock:
+            self.en_vuelo -= liberar
+            try:
+                if h.get("x-requests-remaining") is not None:
+                    self.remaining = int(float(h["x-requests-remaining"]))
+                if h.get("x-requests-used") is not None:
+                    self.used = int(float(h["x-requests-used"]))
+                if h.get("x-requests-last") is not None:
+                    self.last_cost = int(float(h["x-requests-last"]))
+            except ValueError:
+                pass
+
+    def comprobar_quota(self, coste=0, apartar=False):
+        """
+        QuotaAgotada si `coste` dejaría la cuota (menos lo apartado por las
+        llamadas en vuelo) por debajo de la reserva. Con apartar=True, si cabe
+        lo aparta en la misma sección crítica.
+        """
+        with self.lock:
+            restante = self.remaining
+            if restante is not None:
+                restante -= self.en_vuelo
+                if restante - coste < QUOTA_RESERVA:
+                    raise QuotaAgotada(f"quedan {restante} créditos libres, la llamada cuesta {coste} "
+                                       f"(reserva {QUOTA_RESERVA})")
+            if apartar:
+                self.en_vuelo += coste
+
+    def quota(self):
+        with self.lock:
+            return {"remaining": self.remaining, "used": self.used, "last": self.last_cost}
+
+    # ---- peticiones ----
+    @staticmethod
+    def _serie(path):
+        return "http.odds" if "/odds" in path else "http.otros"
+
+    def get(self, path, params=None, timeout=30, coste=0, stream=False):
+        """GET con rate limit y reintentos. Devuelve la Response (ya validada)."""
+        self.comprobar_quota(coste, apartar=True)
+        apartado = coste  # se suelta al leer la cuota de la respuesta final
+        url = path if path.startswith("http") else f"{self.base_url}/{path.lstrip('/')}"
+        params = dict(params or {})
+        params.setdefault("apiKey", self.api_key)
+
+        try:
+            for intento in range(MAX_RETRIES + 1):
+                self.bucket.acquire()
+                if intento:
+                    metricas.contar("http.reintentos")
+                t0 = time.perf_counter()
+                try:
+                    resp = self.session.get(url, params=params, timeout=timeout, stream=stream)
+                except (requests.ConnectionError, requests.Timeout):
+                    metricas.contar("http.errores_red")
+                    if intento >= MAX_RETRIES:
+                        raise
+                    self._dormir(intento)
+                    continue
+                # latencia hasta cabeceras (con stream=True el cuerpo llega después)
+                metricas.observar(f"{self._serie(path)}.latencia_ms", (time.perf_counter() - t0) * 1000.0)
+                metricas.contar(f"http.status.{resp.status_code}")
+                reintentar = resp.status_code in _REINTENTABLES and intento < MAX_RETRIES
+                self._actualizar_quota(resp, 0 if reintentar else apartado)
+                if not reintentar:
+                    apartado = 0
+                if resp.status_code >= 400 and self.grabadora:
+                    g = self.grabadora.abrir(path, params, resp)
+                    g.write(resp.content)
+                    g.cerrar()
+                if reintentar:
+                    retry_after = resp.headers.get("Retry-After")
+                    resp.close()
+                    self._dormir(intento, retry_after)
+                    continue
+                resp.raise_for_status()
+                resp.params_enviados = params
+                return resp
+        finally:
+            if apartado:  # error de red sin respuesta: nada que descontar
+                with self.lock:
+                    self.en_vuelo -= apartado
+
+    def get_json(self, path, params=None, timeout=30, coste=0):
+        resp = self.get(path, params=params, timeout=timeout, coste=coste)
+        with metricas.cronometro(f"{self._serie(path)}.descarga_ms"):
+            contenido = resp.content
+        metricas.observar(f"{self._serie(path)}.bytes", len(contenido))
+        if self.grabadora:
+            g = self.grabadora.abrir(path, resp.params_enviados, resp)
+            g.write(contenido)
+            g.cerrar()
+        return resp.json()
+
+    def iter_json(self, path, params=None, timeout=30, coste=0):
+        """
+        Genera los elementos de una respuesta array ([{...}, ...]) según se
+        descargan. Los reintentos cubren hasta recibir la cabecera; un corte
+        a mitad del cuerpo se propaga como excepción.
+        """
+        resp = self.get(path, params=params, timeout=timeout, coste=coste, stream=True)
+        grab = self.grabadora.abrir(path, resp.params_enviados, resp) if self.grabadora else None
+        completa = False
+        n_bytes = 0
+        t0 = time.perf_counter()
+        try:
+            with resp:
+                lector = LectorArrayJSON()
+                dec = codecs.getincrementaldecoder(resp.encoding or "utf-8")()
+                for trozo in resp.iter_content(STREAM_CHUNK):
+                    n_bytes += len(trozo)
+                    if grab:
+                        grab.write(trozo)
+                    yield from lector.alimentar(dec.decode(trozo))
+                yield from lector.alimentar(dec.decode(b"", final=True))
+                otro = lector.cerrar()
+            completa = True
+            # incluye el tiempo que el consumidor tarda en agrupar cada evento
+            metricas.observar(f"{self._serie(path)}.descarga_ms", (time.perf_counter() - t0) * 1000.0)
+            metricas.observar(f"{self._serie(path)}.bytes", n_bytes)
+        finally:
+            if grab:
+                grab.cerrar(completa)
+        if otro is not None:
+            raise ValueError(f"respuesta inesperada de {path}: {str(otro)[:200]}")
+
+    @staticmethod
+    def _dormir(intento, retry_after=None):
+        try:
+            espera = float(retry_after) if retry_after else None
+        except ValueError:
+            espera = None
+        if espera is None:
+            espera = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** intento))
+            espera *= 0.5 + random.random()  # jitter
+        time.sleep(espera)
+
+
+# Cliente único del proceso
+cliente = ClienteOdds()
+
+
+def get_json(path, params=None, timeout=30, coste=0):
+    return cliente.get_json(path, params=params, timeout=timeout, coste=coste)
+
+
+def iter_json(path, params=None, timeout=30, coste=0):
+    return cliente.iter_json(path, params=params, timeout=timeout, coste=coste)
+
+
+def coste_llamada(params) -> int:
+    """Créditos de una llamada /odds: nº mercados × nº regiones."""
+    mks = [m for m in str(params.get("markets", "")).split(",") if m]
+    regs = [r for r in str(params.get("regions", "")).split(",") if r]
+    return max(1, len(mks)) * max(1, len(regs))
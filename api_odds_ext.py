@@ -1,164 +1,295 @@
 # api_odds_ext.py
-import os, json, datetime, requests
+import os, time, datetime, queue, threading
 from collections import defaultdict
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from api_odds_plan import planificar_scan, cargar_mercados_validos, resumen_plan
+from api_odds_cliente import get_json, iter_json, coste_llamada, QuotaAgotada
+import snapshot, historial_odds, movimientos, metricas, normalizacion
+from cuotas_compactas import Internador, Evento, Grupo
 
-API_KEY = os.getenv("ODDS_API_KEY")
-BASE_URL = "https://api.the-odds-api.com/v4"
-VALID_REGIONS = os.getenv("ODDS_REGIONS","eu,uk").split(",")  # ajustable
+VALID_REGIONS = (os.getenv("ODDS_REGIONS") or os.getenv("REGIONS") or "eu,uk").split(",")  # ajustable
 MARKETS = os.getenv("ODDS_MARKETS","spreads,totals,btts,draw_no_bet,alternate_spreads,alternate_totals,h2h").split(",")
-CACHE_FILE = "scan_cache.json"
+CACHE_FILE = "scan_cache.snap"
 CACHE_TTL_SEC = int(os.getenv("SCAN_TTL","900"))  # 15 min
 MAX_DIAS_EVENTO = int(os.getenv("MAX_DIAS_EVENTO","7"))
+ODDS_CONCURRENCY = int(os.getenv("ODDS_CONCURRENCY","8"))  # llamadas simultáneas
+COLA_EVENTOS = int(os.getenv("ODDS_COLA_EVENTOS","256"))  # eventos parseados esperando a agruparse
+SPORTS_WHITELIST = set(filter(None, (os.getenv("SPORTS_WHITELIST") or "").split(",")))
 
-def _utcnow(): return datetime.datetime.utcnow()
+# un solo scan contra la API a la vez: quien llega después lee el snapshot del primero
+_scan_lock = threading.RLock()
 
-def _cache_load():
-    if not os.path.exists(CACHE_FILE): return None
-    try:
-        with open(CACHE_FILE,"r") as f: data = json.load(f)
-        ts = datetime.datetime.fromisoformat(data.get("_ts"))
-        if (_utcnow()-ts).total_seconds() <= CACHE_TTL_SEC:
-            return data.get("payload")
-    except: pass
-    return None
-
-def _cache_save(payload):
-    try:
-        with open(CACHE_FILE,"w") as f:
-            json.dump({"_ts":_utcnow().isoformat(),"payload":payload}, f)
-    except: pass
+def _cache_load(max_age=CACHE_TTL_SEC):
+    """Último scan desde el snapshot binario (perezoso), o None si no vale."""
+    return snapshot.abrir(CACHE_FILE, max_age)
+
+def cargar_ultimo_scan():
+    """El último scan guardado aunque esté caducado (arranque en caliente)."""
+    return _cache_load(max_age=None)
+
+def iter_snapshot(snap):
+    """
+    (sport_key, payload) por cada deporte del snapshot, descomprimiendo una
+    sección cada vez. Un snapshot del formato anterior (un solo bloque con
+    groups_2way/groups_3way) sale como un único deporte "*".
+    """
+    if "groups_2way" in snap:
+        yield "*", {"sport_title": "", "groups_2way": snap.leer("groups_2way"),
+                    "groups_3way": snap.leer("groups_3way")}
+        return
+    for sport_key in snap:
+        yield sport_key, snap.leer(sport_key)
 
 def _get_sports():
-    url = f"{BASE_URL}/sports/?apiKey={API_KEY}"
-    return requests.get(url, timeout=25).json()
+    return get_json("/sports/", timeout=25)
 
-def _get_odds(sport_key, region, markets_csv):
-    url = f"{BASE_URL}/sports/{sport_key}/odds/"
+def _params_odds(regions_csv, markets_csv, commence_from=None, commence_to=None):
     params = {
-        "apiKey": API_KEY, "regions": region,
+        "regions": regions_csv,
         "markets": markets_csv, "oddsFormat": "decimal"
     }
-    return requests.get(url, params=params, timeout=35).json()
+    if commence_from: params["commenceTimeFrom"] = commence_from
+    if commence_to: params["commenceTimeTo"] = commence_to
+    return params
 
-def scan_all_markets():
-    cached = _cache_load()
-    if cached is not None:
-        return cached
+def _get_odds(sport_key, regions_csv, markets_csv, commence_from=None, commence_to=None):
+    params = _params_odds(regions_csv, markets_csv, commence_from, commence_to)
+    return get_json(f"/sports/{sport_key}/odds/", params, timeout=35, coste=coste_llamada(params))
 
-    deportes = _get_sports()
-    hoy = datetime.datetime.now(datetime.timezone.utc)
+def _iter_odds(sport_key, regions_csv, markets_csv, commence_from=None, commence_to=None):
+    """Como _get_odds pero genera los eventos según se descargan (json_incremental)."""
+    params = _params_odds(regions_csv, markets_csv, commence_from, commence_to)
+    return iter_json(f"/sports/{sport_key}/odds/", params, timeout=35, coste=coste_llamada(params))
 
-    # grupos 2-vías: (event_id, market_key, point) -> dict with A/B lists
-    groups_2way = {}
-    # grupos 3-vías (h2h 1X2): (event_id, "h2h") -> dict with A/B/C lists
-    groups_3way = {}
+def _agrupar_eventos(eventos, sport_key, sport_title, groups_2way, groups_3way, tablas=None):
+    """
+    Vuelca los eventos de una respuesta /odds en los grupos 2/3 vías
+    (cuotas_compactas.Grupo). `tablas` = (Internador de casas, Internador
+    de nombres, {event_id: Evento}) compartidas por todo el scan.
+    Cada outcome va a su lado canónico (normalizacion: local/visitante/
+    empate, Over/Under, Yes/No); los que no encajan se descartan.
+    Una cuota por (evento, mercado, línea, outcome, casa): si la misma casa
+    llega otra vez (listada en varias regiones), Lado.upsert se queda con la
+    de last_update más reciente en vez de contarla dos veces.
+    """
+    casas, nombres, eventos_scan = tablas or (Internador(), Internador(), {})
 
-    def ensure_2way(key, meta, names=None):
-        if key not in groups_2way:
-            groups_2way[key] = {"A":[], "B":[], "names": names or {}, "meta": meta}
+    for ev in eventos:
+        try:
+            inicio = datetime.datetime.fromisoformat(ev["commence_time"].replace("Z","+00:00"))
+        except Exception:
+            continue
 
-    def ensure_3way(key, meta, names=None):
-        if key not in groups_3way:
-            groups_3way[key] = {"A":[], "B":[], "C":[], "names": names or {}, "meta": meta}
+        event_id = ev.get("id") or f"{ev.get('home_team')}-{ev.get('commence_time')}"
+        home = ev.get("home_team", "")
+        away = ev.get("away_team") or next((e for e in ev.get("teams", []) if e != home), "")
+        evento = f"{home} vs {away}" if away else "Partido"
+        # metadatos una sola vez por evento
+        meta = eventos_scan.get(event_id)
+        if meta is None:
+            meta = eventos_scan[event_id] = Evento(
+                sport_title, sport_key, evento, inicio.isoformat(), event_id, home, away)
+        # lado canónico de cada outcome por home_team/away_team (y alias), memorizado entre scans
+        indice = normalizacion.indice_evento(event_id, home, away)
 
-    markets_csv = ",".join(MARKETS)
+        for bm in ev.get("bookmakers", []):
+            casa = bm.get("title","Casa")
+            casa_id = casas.id(casa)
+            for m in bm.get("markets", []):
+                mk = m.get("key")  # spreads, totals, btts, draw_no_bet, alternate_*, h2h
+                if mk not in MARKETS: continue
+                tipo = normalizacion.TIPOS.get(mk, "equipos")
+                ts = m.get("last_update") or bm.get("last_update") or ""
+                for oc in m.get("outcomes", []):
+                    price = oc.get("price")
+                    point = oc.get("point")  # puede ser None
+                    name  = oc.get("name")
+                    if not price or price <= 1.01 or name is None:
+                        continue
+                    side, label = indice.lado(tipo, name)
+                    if side is None:
+                        metricas.contar("agrupacion.outcomes_sin_lado")
+                        continue
 
-    for dep in deportes:
-        if not dep.get("active") or dep.get("has_outrights"):  # sin outrights
-            continue
-        sport_key = dep["key"]
-        sport_title = dep["title"]
+                    if mk == "h2h":
+                        key = (event_id, "h2h")
+                        linea = None
+                        grupo = groups_3way.get(key)
+                        if grupo is None:
+                            grupo = groups_3way[key] = Grupo(meta, "h2h", None, 3, casas, nombres)
+                    else:
+                        # 2-vías; los spreads se agrupan por la línea del local
+                        # (local -1.5 y visitante +1.5 en el mismo grupo)
+                        linea = float(point) if point is not None else None
+                        if side == 1 and linea is not None and mk in normalizacion.SPREADS:
+                            linea = -linea or 0.0
+                        key = (event_id, mk, linea)
+                        grupo = groups_2way.get(key)
+                        if grupo is None:
+                            grupo = groups_2way[key] = Grupo(meta, mk, linea, 2, casas, nombres)
+
+                    lado = grupo.lados[side]
+                    if not lado.upsert(price, casa_id, ts):
+                        metricas.contar("agrupacion.cuotas_repetidas")
+                    if lado.nombre is None:
+                        grupo.set_nombre(side, label)
 
-        for region in VALID_REGIONS:
-            try:
-                eventos = _get_odds(sport_key, region, markets_csv)
-            except Exception:
+def _filas(groups_2way, groups_3way):
+    """
+    Cuotas ya deduplicadas de los grupos como filas normalizadas
+    (event_id, mercado, linea, outcome, casa, cuota) para el histórico y
+    los movimientos. Suelta de paso los índices de upsert de cada grupo.
+    """
+    filas = []
+    for g in chain(groups_3way.values(), groups_2way.values()):
+        g.compactar()
+        ev, mk, linea = g.ev.event_id, g.mercado, g.linea
+        for i, lado in enumerate(g.lados):
+            if not lado:
                 continue
+            outcome, casas = g.nombre(i), lado.tabla.nombres
+            filas.extend((ev, mk, linea, outcome, casas[c], p) for p, c in zip(lado.precios, lado.casas))
+    return filas
 
-            for ev in eventos:
-                try:
-                    inicio = datetime.datetime.fromisoformat(ev["commence_time"].replace("Z","+00:00"))
-                except Exception:
-                    continue
-                if (inicio - hoy).days > MAX_DIAS_EVENTO:
+_FIN = object()
+
+def _descargar(c, cola, parar):
+    """Hilo del pool: parsea la respuesta en streaming y pasa cada evento a la cola."""
+    try:
+        if not parar.is_set():
+            for ev in _iter_odds(c["sport_key"], c["regions"], c["markets"],
+                                 c["commence_from"], c["commence_to"]):
+                cola.put((c, ev))
+                if parar.is_set():
+                    break
+        cola.put((c, _FIN))
+    except BaseException as e:
+        cola.put((c, e))
+
+def iter_scan(concurrency=None):
+    """
+    Escanea todos los deportes activos y genera (sport_key, payload) por
+    deporte en cuanto su respuesta termina de agruparse, con
+    payload = {"sport_title", "groups_2way", "groups_3way"}:
+      groups_2way: (event_id, market_key, point) -> Grupo con lados A/B
+                   (en spreads, point = línea del local)
+      groups_3way: (event_id, "h2h") -> Grupo con lados A/B/C
+    Las llamadas del plan (una por deporte, regiones juntas, ver api_odds_plan)
+    se lanzan en paralelo (hasta `concurrency` a la vez, por defecto
+    ODDS_CONCURRENCY). Cada respuesta se parsea en streaming y sus eventos
+    pasan por una cola acotada al hilo que agrupa, así que la agrupación
+    avanza mientras se descarga y nunca hay una respuesta entera en memoria.
+    Tras entregar un deporte no se guarda ninguna referencia a sus grupos:
+    solo viven en memoria los deportes en curso (y lo que retenga el
+    consumidor). Con concurrency=1 el escaneo es secuencial.
+    Si el snapshot en disco aún es válido se sirve de ahí, sin llamar a la API.
+    Es la única ingesta del bot: api_odds, api_odds_secundarios y
+    api_odds_profesional derivan sus vistas de este mismo scan (vistas_odds).
+    """
+    cached = _cache_load()
+    if cached is None:
+        with _scan_lock:
+            cached = _cache_load()
+            if cached is None:
+                yield from _scan_api(concurrency)
+                return
+    with cached:  # el mmap se suelta al acabar (o si se abandona el generador)
+        yield from iter_snapshot(cached)
+
+def _scan_api(concurrency):
+    deportes = _get_sports()
+    plan = planificar_scan(deportes, MARKETS, VALID_REGIONS, cargar_mercados_validos(), MAX_DIAS_EVENTO,
+                           SPORTS_WHITELIST)
+    print(resumen_plan(plan, deportes, MARKETS, VALID_REGIONS))
+
+    ts_scan = time.time()
+    t0 = time.perf_counter()
+    esc = snapshot.Escritor(CACHE_FILE)
+    # por deporte en curso: grupos 2/3 vías, tablas (casas, nombres, eventos)
+    # y [ms agrupando, nº eventos] para las métricas; las cuotas para el
+    # histórico y los movimientos salen de los grupos ya deduplicados al cerrar
+    en_curso = {}
+
+    workers = max(1, int(concurrency or ODDS_CONCURRENCY))
+    cola = queue.Queue(maxsize=COLA_EVENTOS)  # acotada: si agrupar va lento, la descarga espera
+    parar = threading.Event()
+    pendientes = len(plan)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for c in plan:
+            pool.submit(_descargar, c, cola, parar)
+        try:
+            # la agrupación corre solo en este hilo, evento a evento; cada
+            # llamada del plan termina con un _FIN o con su excepción
+            while pendientes:
+                c, ev = cola.get()
+                if ev is _FIN or isinstance(ev, BaseException):
+                    pendientes -= 1
+                    if isinstance(ev, QuotaAgotada):
+                        if not parar.is_set():
+                            print(f"⛔️ Escaneo detenido: {ev}")
+                            parar.set()  # las llamadas aún no lanzadas terminan sin pedir nada
+                    elif ev is not _FIN:
+                        print(f"⚠️ {c['sport_key']} [{c['regions']}] → {ev}")
+                    parcial = en_curso.pop(c["sport_key"], None)
+                    del ev
+                    if parcial is not None:
+                        yield c["sport_key"], _cerrar_deporte(c, parcial, esc, ts_scan)
+                        del parcial
                     continue
+                parcial = en_curso.get(c["sport_key"])
+                if parcial is None:
+                    parcial = en_curso[c["sport_key"]] = ({}, {}, (Internador(), Internador(), {}), [0.0, 0])
+                g2, g3, tablas, cuenta = parcial
+                ta = time.perf_counter()
+                _agrupar_eventos((ev,), c["sport_key"], c["sport_title"], g2, g3, tablas)
+                cuenta[0] += time.perf_counter() - ta
+                cuenta[1] += 1
+                del ev, parcial
+        finally:
+            # consumidor que abandona o error: que los hilos no se queden
+            # bloqueados en la cola llena
+            parar.set()
+            while pendientes:
+                _, ev = cola.get()
+                if ev is _FIN or isinstance(ev, BaseException):
+                    pendientes -= 1
+
+    try:
+        with metricas.cronometro("snapshot.guardar_ms"):
+            esc.cerrar(ts_scan)
+    except Exception as e:
+        print(f"⚠️ No se pudo guardar el snapshot {CACHE_FILE}: {e}")
+    metricas.observar("scan.total_ms", (time.perf_counter() - t0) * 1000.0)
+    metricas.observar("scan.llamadas", len(plan))
+
+def _cerrar_deporte(c, parcial, esc, ts_scan):
+    """Histórico, movimientos y sección del snapshot de un deporte ya agrupado."""
+    g2, g3, tablas, (seg_agrupando, n_eventos) = parcial
+    filas = _filas(g2, g3)
+    metricas.observar("agrupacion.ms_por_deporte", seg_agrupando * 1000.0)
+    metricas.observar("agrupacion.eventos", n_eventos)
+    metricas.observar("agrupacion.grupos_2way", len(g2))
+    metricas.observar("agrupacion.grupos_3way", len(g3))
+    metricas.observar("agrupacion.cuotas", len(filas))
+    try:
+        with metricas.cronometro("historial.guardar_ms"):
+            historial_odds.guardar_quotes(filas, ts_scan)
+    except Exception as e:
+        print(f"⚠️ No se pudo guardar el histórico de cuotas: {e}")
+    with metricas.cronometro("movimientos.registrar_ms"):
+        movimientos.registrar(filas, ts_scan, tablas[2])
+    payload = {"sport_title": c["sport_title"], "groups_2way": g2, "groups_3way": g3}
+    esc.agregar(c["sport_key"], payload)
+    return payload
 
-                event_id = ev.get("id") or f"{ev.get('home_team')}-{ev.get('commence_time')}"
-                equipos = ev.get("teams", [])
-                home = ev.get("home_team", "")
-                away = [e for e in equipos if e != home]
-                evento = f"{home} vs {away[0]}" if away else "Partido"
-
-                for bm in ev.get("bookmakers", []):
-                    casa = bm.get("title","Casa")
-                    for m in bm.get("markets", []):
-                        mk = m.get("key")  # spreads, totals, btts, draw_no_bet, alternate_*, h2h
-                        if mk not in MARKETS: continue
-                        for oc in m.get("outcomes", []):
-                            price = oc.get("price")
-                            point = oc.get("point")  # puede ser None
-                            name  = oc.get("name")
-                            if not price or price <= 1.01 or name is None:
-                                continue
-
-                            meta = {
-                                "deporte": sport_title,
-                                "sport_key": sport_key,
-                                "evento": evento,
-                                "hora": inicio.isoformat(),
-                                "event_id": event_id
-                            }
-
-                            if mk == "h2h":
-                                key = (event_id, "h2h")
-                                ensure_3way(key, {**meta, "mercado":"h2h"})
-                                # map a/b/c por nombre
-                                # intentamos home/away/draw, si no, por orden alfabético estable
-                                nm = name.strip()
-                                if nm.lower() in ("draw","empate","tie","x"):
-                                    groups_3way[key]["C"].append((price, casa))
-                                    groups_3way[key]["names"]["C"] = nm
-                                elif nm == home:
-                                    groups_3way[key]["A"].append((price, casa))
-                                    groups_3way[key]["names"]["A"] = nm
-                                else:
-                                    groups_3way[key]["B"].append((price, casa))
-                                    groups_3way[key]["names"]["B"] = nm
-                                continue
-
-                            # 2-vías
-                            key = (event_id, mk, float(point) if point is not None else None)
-                            ensure_2way(key, {**meta, "mercado": mk, "linea": point}, names={})
-                            nm = name.strip()
-                            # estandariza names para totals y btts
-                            if mk.startswith("totals") or mk == "totals" or mk == "alternate_totals":
-                                # Over/Under
-                                if nm.lower() in ("over","o","más","mas"):
-                                    groups_2way[key]["A"].append((price, casa))
-                                    groups_2way[key]["names"]["A"] = "Over"
-                                else:
-                                    groups_2way[key]["B"].append((price, casa))
-                                    groups_2way[key]["names"]["B"] = "Under"
-                            elif mk in ("btts","draw_no_bet"):
-                                # Yes/No o EquipoA/EquipoB
-                                if nm.lower() in ("yes","sí","si"):
-                                    groups_2way[key]["A"].append((price, casa))
-                                    groups_2way[key]["names"]["A"] = "Yes"
-                                elif nm.lower() in ("no"):
-                                    groups_2way[key]["B"].append((price, casa))
-                                    groups_2way[key]["names"]["B"] = "No"
-                                else:
-                                    # equipo A/B (DNB)
-                                    # mapeo estable por orden alfabético
-                                    side = "A" if nm < (groups_2way[key]["names"].get("A") or "Ω") else "B"
-                                    groups_2way[key][side].append((price, casa))
-                                    groups_2way[key]["names"][side] = nm
-                            else:
-                                # spreads/alternate_spreads -> equipo A/B
-                                side = "A" if nm < (groups_2way[key]["names"].get("A") or "Ω") else "B"
-                                groups_2way[key][side].append((price, casa))
-                                groups_2way[key]["names"][side] = nm
-
-    payload = {"groups_2way": groups_2way, "groups_3way": groups_3way}
-    _cache_save(payload)
-    return payload
\ No newline at end of file
+def scan_all_markets(concurrency=None):
+    """
+    El scan completo de una vez: {"groups_2way", "groups_3way"} de todos los
+    deportes juntos. Para procesar deporte a deporte usar iter_scan().
+    """
+    groups_2way, groups_3way = {}, {}
+    for _, payload in iter_scan(concurrency):
+        groups_2way.update(payload["groups_2way"])
+        groups_3way.update(payload["groups_3way"])
+    return {"groups_2way": groups_2way, "groups_3way": groups_3way}
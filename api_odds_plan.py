@@ -0,0 +1,100 @@
+# api_odds_plan.py
+"""
+Planificador de llamadas a The Odds API.
+
+Construye el conjunto mínimo de llamadas /odds para un escaneo:
+  - una sola llamada por deporte con todas las regiones juntas (regions=eu,uk)
+  - solo los mercados que el deporte soporta según mercados_validos
+  - commenceTimeTo en vez de filtrar tras descargar (sin commenceTimeFrom:
+    los partidos ya empezados siguen entrando, como antes del plan)
+
+The Odds API cobra por llamada /odds: nº de mercados × nº de regiones.
+"""
+import datetime
+
+# Mercados que mercados_validos comprueba por deporte; el resto no se puede
+# filtrar con esa caché y se piden tal cual.
+MERCADOS_SONDEADOS = ("h2h", "spreads", "totals")
+
+
+def cargar_mercados_validos():
+    """Mapa sport_key -> [mercados]; {} si no se puede obtener (se piden todos)."""
+    try:
+        from mercados_validos import obtener_mercados_validos
+        return obtener_mercados_validos() or {}
+    except Exception as e:
+        print(f"⚠️ Sin mercados válidos por deporte, se piden todos: {e}")
+        return {}
+
+
+def ventana_commence(max_dias, ahora=None):
+    """
+    (commenceTimeFrom, commenceTimeTo) en el formato ISO que acepta la API.
+    Sin límite inferior (None) para no perder los eventos en juego.
+    """
+    ahora = ahora or datetime.datetime.now(datetime.timezone.utc)
+    ahora = ahora.astimezone(datetime.timezone.utc).replace(microsecond=0)
+    hasta = ahora + datetime.timedelta(days=int(max_dias) + 1)
+    return None, hasta.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def mercados_para_deporte(sport_key, markets, mercados_validos):
+    """
+    Filtra `markets` con la lista válida del deporte. Si la caché está vacía o
+    no conoce el deporte (p. ej. activo desde el último sondeo), devuelve
+    `markets` sin tocar.
+    """
+    validos = (mercados_validos or {}).get(sport_key)
+    if not validos:
+        return list(markets)
+    validos = set(validos)
+    return [mk for mk in markets if mk not in MERCADOS_SONDEADOS or mk in validos]
+
+
+def planificar_scan(deportes, markets, regions, mercados_validos=None, max_dias=7, whitelist=None):
+    """
+    Devuelve la lista de llamadas a realizar. Cada llamada es un dict:
+      {sport_key, sport_title, regions, markets, commence_from, commence_to, coste}
+    """
+    regions = [r.strip() for r in regions if r and r.strip()]
+    regions_csv = ",".join(dict.fromkeys(regions))  # sin duplicados, orden estable
+    desde, hasta = ventana_commence(max_dias)
+
+    plan = []
+    for dep in deportes:
+        if not dep.get("active") or dep.get("has_outrights"):  # sin outrights
+            continue
+        sport_key = dep["key"]
+        if whitelist and sport_key not in whitelist:
+            continue
+        mks = mercados_para_deporte(sport_key, markets, mercados_validos)
+        if not mks:
+            continue
+        plan.append({
+            "sport_key": sport_key,
+            "sport_title": dep.get("title", sport_key),
+            "regions": regions_csv,
+            "markets": ",".join(mks),
+            "commence_from": desde,
+            "commence_to": hasta,
+            "coste": len(mks) * len(regions_csv.split(",")),
+        })
+    return plan
+
+
+def coste_plan(plan) -> int:
+    """Créditos que consumirá el plan (cota superior: eventos vacíos no cobran)."""
+    return sum(c["coste"] for c in plan)
+
+
+def coste_sin_plan(deportes, markets, regions) -> int:
+    """Lo que costaría el escaneo ingenuo: todos los mercados, una llamada por región."""
+    activos = sum(1 for d in deportes if d.get("active") and not d.get("has_outrights"))
+    return activos * len(markets) * len(regions)
+
+
+def resumen_plan(plan, deportes=None, markets=None, regions=None) -> str:
+    txt = f"🧮 Plan de escaneo: {len(plan)} llamadas, {coste_plan(plan)} créditos"
+    if deportes is not None and markets is not None and regions is not None:
+        txt += f" (sin plan: {coste_sin_plan(deportes, markets, regions)})"
+    return txt
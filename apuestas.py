@@ -1,82 +1,394 @@
 # apuestas.py
-import os, json, time
+import os, json, time, datetime, heapq
+import movimientos, metricas, banks, cartera
+from consultas import TablaCandidatos
+from render import CacheRender
 from utils_valor import esc_md, fmt_hora, kelly_fraction
-from selector_valor import build_two_way_candidates, build_three_way_candidates, detect_surebets_two_way, detect_surebets_three_way
-from api_odds_ext import scan_all_markets
+from normalizacion import linea_seleccion
+from selector_valor import build_two_way_candidates, build_three_way_candidates, detect_surebets_two_way, detect_surebets_three_way, detect_surebets_cruzados, detect_middles
+from api_odds_ext import iter_scan, iter_snapshot, cargar_ultimo_scan, CACHE_TTL_SEC
 
 EDGE_MIN = float(os.getenv("EDGE_MIN","0.02"))
 MIN_BOOKS = int(os.getenv("MIN_BOOKS","3"))
 STAKE_MIN = float(os.getenv("STAKE_MIN","0.002"))  # 0.2% bank
 STAKE_MAX = float(os.getenv("STAKE_MAX","0.02"))   # 2% bank
 KELLY_CAP = float(os.getenv("KELLY_CAP","0.25"))   # 25% Kelly
+# cartera (Kelly simultáneo de todas las value bets del scan, ver cartera.py)
+KELLY_FRACCION = float(os.getenv("KELLY_FRACCION","0.25"))        # Kelly fraccional de la cartera
+CARTERA_MAX_EVENTO = float(os.getenv("CARTERA_MAX_EVENTO","0.05"))  # 5% bank por partido
+CARTERA_MAX_CASA = float(os.getenv("CARTERA_MAX_CASA","0.15"))      # 15% bank por casa
+CARTERA_MAX_TOTAL = float(os.getenv("CARTERA_MAX_TOTAL","0.30"))    # 30% bank en total
 
-_bank_file = "bank.json"
-_cache = {"t":0, "value":[], "surebets":[], "middles":[]}
+ALERT_MAX = int(os.getenv("ALERT_MAX","10"))       # picks por push y tipo
+MIDDLE_COSTE_MAX = float(os.getenv("MIDDLE_COSTE_MAX","1.06"))  # sum(1/cuota) máx. de las dos patas
+# suelo de la tabla de candidatos para consultas (/value edge=... books=...)
+CONSULTA_EDGE_MIN = min(EDGE_MIN, float(os.getenv("CONSULTA_EDGE_MIN","0")))
+CONSULTA_MIN_BOOKS = min(MIN_BOOKS, int(os.getenv("CONSULTA_MIN_BOOKS","2")))
 
-def get_bank():
-    if os.path.exists(_bank_file):
+_subs_file = "suscriptores.json"
+_alertas_file = "alertas_enviadas.json"
+_cache = {"t":0, "version":0, "value":[], "surebets":[], "middles":[], "tabla":TablaCandidatos([])}
+
+def get_bank(chat_id=None):
+    """Bank del chat, desde memoria (banks.py); sin chat, el bank por defecto."""
+    return banks.obtener(chat_id)
+
+def set_bank(amount: float, chat_id=None):
+    banks.fijar(chat_id, amount)
+
+# ---- Suscripciones a alertas ----
+def _load_json(path, default):
+    if os.path.exists(path):
         try:
-            with open(_bank_file,"r") as f: return float(json.load(f).get("bank",1000.0))
-        except: pass
-    return 1000.0
+            with open(path,"r") as f: return json.load(f)
+        except Exception: pass
+    return default
+
+def _save_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp,"w") as f: json.dump(data, f)
+    os.replace(tmp, path)
+
+def get_suscriptores():
+    return set(_load_json(_subs_file, []))
+
+def suscribir(chat_id) -> bool:
+    subs = get_suscriptores()
+    if chat_id in subs: return False
+    subs.add(chat_id); _save_json(_subs_file, sorted(subs))
+    return True
+
+def desuscribir(chat_id) -> bool:
+    subs = get_suscriptores()
+    if chat_id not in subs: return False
+    subs.discard(chat_id); _save_json(_subs_file, sorted(subs))
+    return True
+
+def _clave_alerta(tipo, pick):
+    m = pick.get("meta", {})
+    linea = m.get("linea", pick.get("linea"))
+    return "|".join(str(x) for x in (tipo, m.get("event_id"), pick.get("mercado", m.get("mercado")), linea, pick.get("nombre","")))
+
+def _enviadas():
+    """Claves de alertas ya enviadas -> hora ISO del evento, sin las de eventos ya empezados."""
+    ahora = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    return {k: h for k, h in _load_json(_alertas_file, {}).items() if h and h > ahora}
+
+def picks_nuevos(parcial=None):
+    """
+    Value bets y surebets del último scan (o de `parcial`, un deporte recién
+    escaneado) que aún no se han enviado. No las marca: eso lo hace
+    marcar_enviados una vez entregadas.
+    """
+    origen = _cache if parcial is None else parcial
+    enviadas = _enviadas()
+    nuevos = {"value": [], "surebets": []}
+    for tipo in nuevos:
+        vistas = set()
+        for pick in origen.get(tipo, []):
+            k = _clave_alerta(tipo, pick)
+            if k in enviadas or k in vistas: continue
+            vistas.add(k)
+            nuevos[tipo].append(pick)
+            if len(nuevos[tipo]) >= ALERT_MAX: break
+    return nuevos["value"], nuevos["surebets"]
 
-def set_bank(amount: float):
-    with open(_bank_file,"w") as f: json.dump({"bank": float(amount)}, f)
+def marcar_enviados(values, sbs):
+    """Marca como enviadas (persistido) las picks ya entregadas y olvida las de eventos ya empezados."""
+    enviadas = _enviadas()
+    for tipo, picks in (("value", values), ("surebets", sbs)):
+        for pick in picks:
+            enviadas[_clave_alerta(tipo, pick)] = pick.get("meta", {}).get("hora") or ""
+    _save_json(_alertas_file, enviadas)
 
-def scan():
-    payload = scan_all_markets()
+def cache_edad():
+    """Segundos desde el último scan completado (None si aún no hay ninguno)."""
+    return time.time() - _cache["t"] if _cache["t"] else None
+
+def cache_fresca():
+    edad = cache_edad()
+    return edad is not None and edad <= CACHE_TTL_SEC
+
+# ---- Pipeline por deporte: descarga → agrupa → selecciona → ranking global ----
+# cada lista por deporte ya sale ordenada del selector; el ranking global es
+# un heapq.merge con la misma clave
+_ORDEN = {
+    "candidatos_2": (lambda x: (x["edge"], x["p_fair"]), True),
+    "candidatos_3": (lambda x: (x["edge"], x["p_fair"]), True),
+    "surebets_2": (lambda x: x["arb_margin"], True),
+    "surebets_3": (lambda x: x["arb_margin"], True),
+    "surebets_x": (lambda x: x["arb_margin"], True),
+    "middles": (lambda x: (-x["ancho"], x["coste"]), False),
+}
+
+def _es_value(p):
+    return p["edge"] >= EDGE_MIN and p["books"] >= MIN_BOOKS
+
+def _seleccionar(payload):
     g2 = payload["groups_2way"]
     g3 = payload["groups_3way"]
-    value = build_two_way_candidates(g2, MIN_BOOKS, EDGE_MIN) + build_three_way_candidates(g3, MIN_BOOKS, EDGE_MIN)
-    sbs = detect_surebets_two_way(g2) + detect_surebets_three_way(g3)
-    _cache.update(t=time.time(), value=value, surebets=sbs)
-    return len(value), len(sbs)
+    return {
+        # todos los candidatos sobre el suelo de consultas; /value por defecto filtra con _es_value
+        "candidatos_2": build_two_way_candidates(g2, CONSULTA_MIN_BOOKS, CONSULTA_EDGE_MIN),
+        "candidatos_3": build_three_way_candidates(g3, CONSULTA_MIN_BOOKS, CONSULTA_EDGE_MIN),
+        "surebets_2": detect_surebets_two_way(g2),
+        "surebets_3": detect_surebets_three_way(g3),
+        "surebets_x": detect_surebets_cruzados(g2, g3),
+        "middles": detect_middles(g2, MIDDLE_COSTE_MAX),
+    }
+
+def _fusionar(partes):
+    # partes[k] = [(sport_key, lista)]; en orden de deporte para que los empates
+    # no dependan de qué respuesta llegó antes (replay reproducible)
+    m = {k: list(heapq.merge(*(l for _, l in sorted(partes[k], key=lambda p: p[0])), key=key, reverse=rev))
+         for k, (key, rev) in _ORDEN.items()}
+    key, rev = _ORDEN["candidatos_2"]
+    return {"value": [p for p in m["candidatos_2"] if _es_value(p)] + [p for p in m["candidatos_3"] if _es_value(p)],
+            "surebets": m["surebets_2"] + m["surebets_3"] + m["surebets_x"],
+            "middles": m["middles"],
+            "tabla": TablaCandidatos(list(heapq.merge(m["candidatos_2"], m["candidatos_3"], key=key, reverse=rev)))}
+
+def _procesar(deportes, t, al_deporte=None):
+    """
+    Consume (sport_key, payload) deporte a deporte: selecciona, suelta los
+    grupos y, si se da `al_deporte`, le pasa el resultado parcial
+    {"sport_key", "deporte", "value", "candidatos", "surebets", "middles"} en
+    cuanto está.
+    Al terminar publica el ranking global en _cache.
+    """
+    partes = {k: [] for k in _ORDEN}
+    for sport_key, payload in deportes:
+        sel = _seleccionar(payload)
+        deporte = payload.get("sport_title") or sport_key
+        del payload  # los grupos de este deporte ya no se necesitan
+        for k in partes:
+            partes[k].append((sport_key, sel[k]))
+        if al_deporte is not None:
+            try:
+                al_deporte({"sport_key": sport_key, "deporte": deporte,
+                            "value": [p for p in sel["candidatos_2"] + sel["candidatos_3"] if _es_value(p)],
+                            "candidatos": list(heapq.merge(sel["candidatos_2"], sel["candidatos_3"],
+                                                           key=_ORDEN["candidatos_2"][0], reverse=True)),
+                            "surebets": sel["surebets_2"] + sel["surebets_3"] + sel["surebets_x"],
+                            "middles": sel["middles"]})
+            except Exception as e:
+                print(f"⚠️ Error entregando resultados parciales de {sport_key}: {e}")
+    _cache.update(t=t, version=_cache["version"] + 1, **_fusionar(partes))
+    return len(_cache["value"]), len(_cache["surebets"])
+
+def scan(al_deporte=None):
+    """Scan completo por deportes; `al_deporte(parcial)` recibe cada deporte al terminar."""
+    return _procesar(iter_scan(), time.time(), al_deporte)
+
+def arranque_en_caliente():
+    """
+    Carga el último snapshot en disco (aunque esté caducado) para responder
+    desde el primer mensaje sin llamar a la API. Conserva su antigüedad real,
+    así que el siguiente /value lo refresca en segundo plano si toca.
+    """
+    snap = cargar_ultimo_scan()
+    if snap is None:
+        return False
+    with snap:
+        _procesar(iter_snapshot(snap), snap.ts)
+    return True
+
+def consultar(consulta, values=None):
+    """
+    Candidatos que cumplen `consulta` (consultas.parsear) desde la tabla del
+    último scan, o filtrando `values` (p.ej. un resultado parcial).
+    """
+    with metricas.cronometro("consultas.ms"):
+        tabla = _cache["tabla"] if values is None else TablaCandidatos(values)
+        return tabla.consultar(consulta)
 
 def _stake(bank, p_fair, cuota):
     f = kelly_fraction(p_fair, float(cuota)-1.0, KELLY_CAP)
     s = max(STAKE_MIN*bank, min(STAKE_MAX*bank, f*bank))
     return round(s, 2), round(f*100,2)
 
-def format_values(n=5):
-    bank = get_bank()
-    vals = _cache.get("value",[])[:max(1,int(n))]
-    if not vals: return "🤷 No hay value bets en caché. Usa /scan primero."
-    parts = ["🔎 Value bets encontradas (top):\n"]
-    for v in vals:
-        stake, f_k = _stake(bank, v["p_fair"], v["cuota"])
-        linea = f" {v.get('linea')}" if v.get("linea") is not None else ""
-        parts.append(
-            f"🎯 {esc_md(v['deporte'])} – {esc_md(v['evento'])}\n"
-            f"• Mercado: {esc_md(v.get('mercado',''))}{esc_md(linea)}\n"
-            f"• Selección: {esc_md(v['nombre'])} @ {v['cuota']} ({esc_md(v['casa'])})\n"
-            f"📅 {fmt_hora(v['hora'])} | p_fair: {round(v['p_fair']*100,2)}% | edge: {round(v['edge']*100,2)}%\n"
-            f"💸 Stake sugerido: {stake} (Kelly {f_k}%)\n"
-        )
+def _clave_pick(v):
+    m = v.get("meta", {})
+    return m.get("event_id"), m.get("mercado"), m.get("linea"), v.get("nombre"), v.get("casa")
+
+_cartera = {"version": None, "f": {}, "total": 0.0, "n": 0}
+
+def _cartera_scan():
+    """
+    Cartera de todas las value bets del último scan (cartera.fracciones), una
+    vez por versión: páginas, consultas y alertas comparten los mismos topes.
+    """
+    version, vals = _cache["version"], _cache.get("value", [])
+    if _cartera["version"] != version:
+        with metricas.cronometro("cartera.ms"):
+            fs = cartera.fracciones(vals, KELLY_FRACCION, STAKE_MAX, CARTERA_MAX_EVENTO,
+                                    CARTERA_MAX_CASA, CARTERA_MAX_TOTAL, STAKE_MIN)
+        _cartera.update(version=version, f={_clave_pick(v): f for v, f in zip(vals, fs)},
+                        total=sum(fs), n=sum(1 for f in fs if f))
+    return _cartera
+
+def stakes_cartera(picks):
+    """
+    Fracción del bank de cada pick dentro de la cartera del scan; None si el
+    pick no está en él (p. ej. un deporte del scan que aún está en curso).
+    """
+    f = _cartera_scan()["f"]
+    return [f.get(_clave_pick(v)) for v in picks]
+
+# ---- Render (MarkdownV2) ----
+# cada bloque se compone en texto plano y se escapa de una vez con esc_md;
+# solo las cabeceras llevan marcado (negrita). Las páginas completas se
+# cachean por (tipo, versión del scan, bank, página): main las trocea a 4096.
+_render = CacheRender()
+
+def _titulo(txt):
+    return f"*{esc_md(txt)}*\n"
+
+def _pagina(lista, n, pagina):
+    n = max(1, int(n))
+    ini = (max(1, int(pagina)) - 1) * n
+    return lista[ini:ini + n]
+
+def _fmt_value(v, bank, f_cartera):
+    m = v.get("meta", {})
+    _, f_k = _stake(bank, v["p_fair"], v["cuota"])
+    linea = linea_seleccion(m.get("mercado"), m.get("linea"), v["nombre"], m.get("home"))
+    linea = f" {linea}" if linea is not None else ""
+    if f_cartera is None:
+        stake = "— (pendiente: entra en la cartera al terminar el scan)"
+    elif f_cartera:
+        stake = f"{round(f_cartera*bank, 2)} ({round(f_cartera*100, 2)}% bank)"
+    else:
+        stake = "— (fuera de cartera)"
+    return esc_md(
+        f"🎯 {m.get('deporte','')} – {m.get('evento','')}\n"
+        f"• Mercado: {m.get('mercado','')}{linea}\n"
+        f"• Selección: {v['nombre']} @ {v['cuota']} ({v['casa']})\n"
+        f"📅 {fmt_hora(m.get('hora'))} | p_fair: {round(v['p_fair']*100,2)}% | edge: {round(v['edge']*100,2)}%\n"
+        f"💸 Stake cartera: {stake} | Kelly individual {f_k}%\n"
+    )
+
+def _fmt_values(vals, bank):
+    """Bloques de los picks con sus stakes en la cartera del scan y una línea de resumen."""
+    fs = stakes_cartera(vals)
+    c = _cartera_scan()
+    resumen = esc_md(f"📊 Cartera del scan: {round(c['total']*bank, 2)} ({round(c['total']*100, 2)}% del bank {bank}) "
+                     f"en {c['n']} picks; aquí {round(sum(f or 0.0 for f in fs)*100, 2)}%\n")
+    return [resumen] + [_fmt_value(v, bank, f) for v, f in zip(vals, fs)]
+
+def _fmt_surebet(s):
+    m = s.get("meta", {})
+    linea = f" {s.get('linea')}" if s.get("linea") is not None else ""
+    return esc_md(
+        f"🎯 {m.get('deporte','')} – {m.get('evento','')}\n"
+        f"• Mercado: {s.get('mercado','')}{linea}\n"
+        f"📅 {fmt_hora(m.get('hora'))} | margen: {round(s['arb_margin']*100,2)}%\n"
+        + (f"• Precios: {s['precios']}\n" if "patas" not in s else
+           "".join(f"• {p['nombre']} ({p['mercado']}) @ {p['cuota']} en {p['casa']}: "
+                   f"{round(p['stake']*100, 2)}% del stake\n" for p in s["patas"]))
+    )
+
+def _render_values(vals, bank, titulo):
+    parts = [_titulo(titulo)]
+    parts += _fmt_values(vals, bank)
     return "\n".join(parts)
 
-def format_surebets(n=5):
-    sbs = _cache.get("surebets",[])[:max(1,int(n))]
-    if not sbs: return "🤷 No hay arbitrajes en caché. Usa /scan primero."
-    parts = ["🟢 Arbitrajes (surebets) detectados:\n"]
-    for s in sbs:
-        linea = f" {s.get('linea')}" if s.get("linea") is not None else ""
-        parts.append(
-            f"🎯 {esc_md(s['deporte'])} – {esc_md(s['evento'])}\n"
-            f"• Mercado: {esc_md(s.get('mercado',''))}{esc_md(linea)}\n"
-            f"📅 {fmt_hora(s['hora'])} | margen: {round(s['arb_margin']*100,2)}%\n"
-            f"• Precios: {s['precios']}\n"
-        )
+def format_values(n=5, values=None, pagina=1, chat_id=None):
+    bank = get_bank(chat_id)
+    if values is not None:
+        vals = _pagina(values, n, pagina)
+        return _render_values(vals, bank, "🔎 Value bets encontradas (top):") if vals else esc_md("🤷 No hay value bets en el último scan.")
+
+    def render():
+        vals = _pagina(_cache.get("value",[]), n, pagina)
+        if not vals: return esc_md("🤷 No hay value bets en el último scan.")
+        return _render_values(vals, bank, "🔎 Value bets encontradas (top):" if pagina <= 1 else f"🔎 Value bets (página {pagina}):")
+    return _render.obtener(("value", _cache["version"], bank, n, pagina), render)
+
+def format_consulta(consulta, values=None, chat_id=None):
+    n, pagina = consulta.get("n", 5), consulta.get("pagina", 1)
+    bank = get_bank(chat_id)
+
+    def render():
+        vals = consultar(dict(consulta, n=n * pagina), values)[(pagina - 1) * n:]
+        if not vals: return esc_md("🤷 Ningún candidato cumple la consulta.")
+        return _render_values(vals, bank, "🔎 Candidatos de la consulta:")
+    if values is not None:
+        return render()
+    clave = tuple(sorted((k, tuple(sorted(v)) if isinstance(v, set) else v) for k, v in consulta.items()))
+    return _render.obtener(("consulta", _cache["version"], bank, clave), render)
+
+def format_surebets(n=5, surebets=None, pagina=1):
+    def render():
+        sbs = _pagina(_cache.get("surebets",[]) if surebets is None else surebets, n, pagina)
+        if not sbs: return esc_md("🤷 No hay arbitrajes en el último scan.")
+        parts = [_titulo("🟢 Arbitrajes (surebets) detectados:")]
+        parts += [_fmt_surebet(s) for s in sbs]
+        return "\n".join(parts)
+    if surebets is not None:
+        return render()
+    return _render.obtener(("surebets", _cache["version"], n, pagina), render)
+
+def format_alertas(values, surebets, bank=None):
+    """Texto del push con las value bets y surebets nuevas ("" si no hay nada)."""
+    parts = []
+    if values:
+        bank = get_bank() if bank is None else bank
+        parts.append(_titulo("🔔 Nuevas value bets:"))
+        parts += _fmt_values(values, bank)
+    if surebets:
+        parts.append(_titulo("🔔 Nuevos arbitrajes:"))
+        parts += [_fmt_surebet(s) for s in surebets]
     return "\n".join(parts)
 
-# opcional: detección simple de middles (totals/spreads) – heurística
-def _find_middles():
-    # Por simplicidad, reusa el último scan y busca en g2 (no expuesto aquí para mantenerlo corto)
-    return []
-
-def format_middles(n=5):
-    mids = _cache.get("middles",[])[:max(1,int(n))]
-    if not mids: return "🤷 No hay middles detectados ahora mismo."
-    parts = ["🟨 Posibles middles: \n"]
-    for m in mids:
-        parts.append(str(m))
-    return "\n".join(parts)
\ No newline at end of file
+def _fmt_middle(m):
+    meta = m.get("meta", {})
+    bajo, alto = m["bajo"], m["alto"]
+    return esc_md(
+        f"🎯 {meta.get('deporte','')} – {meta.get('evento','')}\n"
+        f"• Mercado: {m['mercado']} | ancho: {m['ancho']}\n"
+        f"• {bajo['nombre']} @ {bajo['cuota']} ({bajo['casa']})\n"
+        f"• {alto['nombre']} @ {alto['cuota']} ({alto['casa']})\n"
+        f"📅 {fmt_hora(meta.get('hora'))} | coste: {round(m['coste']*100,2)}%\n"
+    )
+
+def format_middles(n=5, middles=None, pagina=1):
+    def render():
+        mids = _pagina(_cache.get("middles",[]) if middles is None else middles, n, pagina)
+        if not mids: return esc_md("🤷 No hay middles detectados ahora mismo.")
+        parts = [_titulo("🟨 Posibles middles:")]
+        parts += [_fmt_middle(m) for m in mids]
+        return "\n".join(parts)
+    if middles is not None:
+        return render()
+    return _render.obtener(("middles", _cache["version"], n, pagina), render)
+
+
+def _nombre_sel(sel):
+    ev, mk, linea, outcome = sel
+    m = movimientos.meta(ev)
+    linea = f" {linea:g}" if linea is not None else ""
+    return m, f"{m.get('evento', ev)} · {mk}{linea} · {outcome}"
+
+def format_moves(n=5):
+    r = movimientos.resumen(max(1,int(n)))
+    if not r["ts"]: return esc_md("🤷 Aún no hay dos scans para comparar.")
+    if not (r["steam"] or r["rezagadas"] or r["moves"]):
+        return esc_md("😴 Sin movimientos de línea en el último scan.")
+    parts = []
+    if r["steam"]:
+        parts.append(_titulo("🔥 Steam moves:"))
+        for s in r["steam"]:
+            _, txt = _nombre_sel(s["sel"])
+            parts.append(esc_md(f"• {txt}\n  {s['n_casas']} casas acortando: {', '.join(s['casas'])}\n"))
+    if r["rezagadas"]:
+        parts.append(_titulo("🐢 Casas rezagadas:"))
+        for z in r["rezagadas"]:
+            _, txt = _nombre_sel(z["sel"])
+            parts.append(esc_md(f"• {txt}\n  {z['casa']} @ {z['cuota']} vs consenso {z['consenso']} (+{round(z['exceso']*100,2)}%)\n"))
+    if r["moves"]:
+        parts.append(_titulo("📈 Mayores movimientos:"))
+        for mv in r["moves"]:
+            _, txt = _nombre_sel(mv["sel"])
+            parts.append(esc_md(f"• {txt}\n  {mv['casa']}: {mv['antes']} → {mv['ahora']} ({round(mv['cambio']*100,2)}%)\n"))
+    return "\n".join(parts)
@@ -0,0 +1,286 @@
+# arbitraje.py
+"""
+Arbitraje entre mercados (N vías) por evento.
+
+Cada selección se traduce a su pago sobre una variable entera del partido:
+  margen (local − visitante): h2h, draw_no_bet, spreads, alternate_spreads
+  total:                      totals, alternate_totals
+como (tipo, t): "mas" gana si X > t, "menos" si X < t, empate (push) si
+X == t devuelve la apuesta; líneas de cuarto (±0.25, ±0.75) pagan la media
+de sus dos mitades. El empate del h2h es ("empate", 0): gana solo si X == 0.
+  h2h local = mas 0.5       DNB local = spread local 0 = mas 0
+  h2h visit. = menos -0.5   DNB visit. = spread visit. 0 = menos 0
+  spread local h = mas −h   spread visit. +q = menos q (grupo de línea local h = −q)
+  Over L = mas L            Under L = menos L
+Selecciones con el mismo (familia, tipo, t) son equivalentes (mapa de
+equivalencias): de cada clase se queda la mejor cuota, venga del mercado
+que venga.
+
+Por evento y familia: los estados posibles de X son los enteros alrededor
+de cada umbral (filas iguales se funden), A[estado, clase] = retorno por
+unidad. Se prueban pares y, si hay pocas clases, tríos; se descartan en
+bloque los que no cubren todos los estados y los que no pueden bajar de 1
+por la cota Σ 1/a de los estados que solo paga una pata. Para los que
+quedan, el reparto que maximiza el retorno mínimo se busca en los
+vértices: subconjuntos de k filas, A_sub x = 1 resuelto en lote con
+np.linalg.solve, x >= 0 y A x >= 1. Si S = Σx < 1, apostar x/S asegura
+1/S por unidad. Cada evento se resuelve aparte, por lotes de tamaño fijo
+(el relleno de filas solo dentro del lote), y como mucho MAX_COMBOS combos
+por evento (los de menor cota): memoria acotada y coste lineal en eventos.
+"""
+import math, os
+from functools import lru_cache
+from itertools import combinations
+
+import numpy as np
+
+import metricas
+from cuotas_compactas import Lado
+from normalizacion import linea_seleccion
+
+FAMILIA = {
+    "h2h": "margen", "draw_no_bet": "margen", "spreads": "margen", "alternate_spreads": "margen",
+    "totals": "total", "alternate_totals": "total",
+}
+EMPATES = {"draw", "empate", "tie", "x"}
+MAX_CLASES_TRIOS = 12  # con más clases en una familia solo se prueban pares
+LOTE = int(os.getenv("ARB_LOTE", "256"))                   # combos por lote de filtrado/solve
+MAX_COMBOS = int(os.getenv("ARB_MAX_COMBOS_EVENTO", "512"))  # combos resueltos por evento (los de menor cota)
+CELDAS_SOLVE = 1 << 20  # tope de floats del tensor de vértices (lote × subconjuntos × k × k) por lote
+EPS = 1e-9
+
+
+def clases_evento(grupos):
+    """
+    grupos: [(meta, mercado, linea, [(nombre, precios), ...])] de un evento,
+    con los lados del h2h en orden (local, visitante, empate).
+    Devuelve {familia: {(tipo, t): (cuota, casa, etiqueta, mercado, linea)}} y
+    si el evento admite empate en el margen.
+    """
+    clases = {}
+    hay_empate = None  # None = no hay h2h para saberlo (se asume que sí)
+    for meta, mercado, linea, lados in grupos:
+        fam = FAMILIA.get(mercado)
+        if fam is None:
+            continue
+        home = meta.get("home")
+        for i, (nombre, precios) in enumerate(lados):
+            nm = str(nombre).strip()
+            if mercado == "h2h":
+                if nm.lower() in EMPATES or i == 2:
+                    clave = ("empate", 0.0)
+                elif nm == home or (not home and i == 0):
+                    clave = ("mas", 0.5)
+                else:
+                    clave = ("menos", -0.5)
+            elif mercado == "draw_no_bet":
+                if nm.lower() in EMPATES:
+                    continue
+                clave = ("mas", 0.0) if nm == home or (not home and i == 0) else ("menos", 0.0)
+            elif fam == "margen":
+                if linea is None:
+                    continue
+                clave = ("mas", -float(linea)) if nm == home else ("menos", -float(linea))
+            else:
+                if linea is None:
+                    continue
+                clave = ("mas", float(linea)) if nm == "Over" else ("menos", float(linea))
+            if not precios:
+                continue
+            if mercado == "h2h" and clave[0] == "empate":
+                hay_empate = True
+            mejor = _mejor(precios)
+            actual = clases.setdefault(fam, {}).get(clave)
+            if actual is None or mejor[0] > actual[0]:
+                if mercado in ("h2h", "draw_no_bet"):
+                    etiqueta = nm
+                else:
+                    etiqueta = (f"{nm} {linea_seleccion(mercado, float(linea), nm, home):+g}" if fam == "margen"
+                                else f"{nm} {float(linea):g}")
+                clases[fam][clave] = (mejor[0], mejor[1], etiqueta, mercado, linea)
+        if mercado == "h2h" and hay_empate is None:
+            hay_empate = False  # h2h sin empate cotizado: deporte sin empates
+    return clases, hay_empate is not False
+
+
+def _pagos(tipos, t, cuotas, X):
+    """A[x, clase]: retorno por unidad apostada para cada valor de X (cuota, 1 si push o 0)."""
+    X = X[:, None]
+    signo = np.where(tipos == "mas", 1.0, -1.0)
+    cuarto = (4 * t) % 2 == 1  # línea de cuarto: media de las dos mitades
+    A = 0.0
+    for d in (-0.25, 0.25):
+        v = signo * (X - np.where(cuarto, t + d, t))
+        A = A + 0.5 * np.where(v > 0, cuotas, np.where(v == 0, 1.0, 0.0))
+    return np.where(tipos == "empate", np.where(X == 0, cuotas, 0.0), A)
+
+
+def _matriz(claves, cuotas, fam, hay_empate):
+    """A[estado, clase] sobre los estados de X (filas iguales consecutivas fundidas)."""
+    tipos = np.array([tipo for tipo, _ in claves])
+    t = np.array([u for _, u in claves])
+    X = np.arange(np.floor(t.min()) - 1, np.ceil(t.max()) + 2)
+    if fam == "total":
+        X = X[X >= 0]
+    elif not hay_empate:
+        X = X[X != 0]
+    A = _pagos(tipos, t, np.asarray(cuotas, dtype=float), X)
+    # los pagos solo cambian al cruzar un umbral: basta comparar con la fila anterior
+    nueva = np.ones(len(A), dtype=bool)
+    nueva[1:] = (A[1:] != A[:-1]).any(axis=1)
+    return A[nueva]
+
+
+def _mejor(precios):
+    """(cuota, casa) más alta de un lado (Lado compacto o lista de pares)."""
+    if isinstance(precios, Lado):
+        ps = precios.precios
+        i = max(range(len(ps)), key=ps.__getitem__)
+        return ps[i], precios.tabla.nombres[precios.casas[i]]
+    return max(precios, key=lambda x: x[0])
+
+
+@lru_cache(maxsize=None)
+def _combos(n, k):
+    return np.array(list(combinations(range(n), k)), dtype=np.int64).reshape(-1, k)
+
+
+def _filtrar(A, C):
+    """
+    Combos (c × k) que cubren todos los estados y cuya cota inferior de Σx
+    es < 1, con esa cota.
+    """
+    sub = A[:, C].transpose(1, 0, 2)  # (c, m, k)
+    paga = sub > 0
+    cubre = paga.any(axis=2).all(axis=1)
+    solo = paga & (paga.sum(axis=2, keepdims=True) == 1)
+    with np.errstate(divide="ignore"):
+        cota = np.where(solo, 1.0 / np.where(sub > 0, sub, 1.0), 0.0).max(axis=1).sum(axis=1)
+    ok = cubre & (cota < 1.0 - EPS)
+    return C[ok], cota[ok]
+
+
+def _filas_distintas(sub):
+    """(c, m, k) -> (c, u, k): filas distintas de cada combo, rellenando con copias de la primera."""
+    c, m, k = sub.shape
+    clave = sub @ (1.0 + np.arange(k) * np.pi)  # (c, m); filas iguales -> misma clave
+    orden = np.argsort(clave, axis=1)
+    ords = np.take_along_axis(clave, orden, axis=1)
+    nueva = np.ones((c, m), dtype=bool)
+    nueva[:, 1:] = ords[:, 1:] != ords[:, :-1]
+    # distintas primero (argsort estable sobre ~nueva), cortado al máximo de distintas
+    u = int(nueva.sum(axis=1).max())
+    sel = np.take_along_axis(orden, np.argsort(~nueva, axis=1, kind="stable"), axis=1)[:, :u]
+    U = np.take_along_axis(sub, sel[:, :, None], axis=1)
+    relleno = np.arange(u)[None, :] >= nueva.sum(axis=1)[:, None]
+    U[relleno] = np.broadcast_to(U[:, :1, :], U.shape)[relleno]
+    return U
+
+
+def _resolver(sub):
+    """
+    Por combo (sub: c × m × k), mínima Σx con A x >= 1, x >= 0, buscando en
+    los vértices de k filas; todos los sistemas k×k del lote van en un solo
+    np.linalg.solve. Devuelve (S, x) con S = inf si no hay solución.
+    """
+    c, _, k = sub.shape
+    U = _filas_distintas(sub)
+    u = U.shape[1]
+    S = np.full(c, np.inf)
+    x = np.zeros((c, k))
+    if u < k:
+        return S, x
+    M = U[:, _combos(u, k)]  # (c, s, k, k)
+    ok = np.abs(np.linalg.det(M)) > EPS
+    if not ok.any():
+        return S, x
+    xs = np.full(ok.shape + (k,), -1.0)
+    xs[ok] = np.linalg.solve(M[ok], np.ones((int(ok.sum()), k, 1)))[..., 0]
+    retorno = np.einsum("cmk,csk->csm", sub, xs)  # contra todas las filas, no solo las distintas
+    validos = ok & (xs >= -EPS).all(axis=2) & (retorno >= 1.0 - 1e-7).all(axis=2)
+    sumas = np.where(validos, xs.sum(axis=2), np.inf)
+    j = sumas.argmin(axis=1)
+    S = sumas[np.arange(c), j]
+    x = np.maximum(xs[np.arange(c), j], 0.0)
+    return S, x
+
+
+def _candidatos(A, n, info):
+    """
+    [(k, combos, cota)] de una familia: combos que pasan el filtro y no son
+    de un solo grupo (esos ya los ven detect_surebets_*). Filtra por lotes
+    de LOTE para acotar la memoria (lote × estados × k).
+    """
+    grupos = {}
+    gid = np.array([grupos.setdefault((i[3], i[4]), len(grupos)) for i in info])
+    out = []
+    for k in ((2, 3) if n <= MAX_CLASES_TRIOS else (2,)):
+        todos = _combos(n, k)
+        for i in range(0, len(todos), LOTE):
+            C, cota = _filtrar(A, todos[i:i + LOTE])
+            if len(C):
+                varios = (gid[C] != gid[C[:, :1]]).any(axis=1)
+                if varios.any():
+                    out.append((k, C[varios], cota[varios]))
+    return out
+
+
+def _evento(grupos_ev):
+    """Surebets entre mercados de un evento. Memoria acotada por LOTE, trabajo por MAX_COMBOS."""
+    meta = grupos_ev[0][0]
+    clases, hay_empate = clases_evento(grupos_ev)
+    familias = []  # (A, info, k, combos, cota)
+    for fam, por_clave in clases.items():
+        n = len(por_clave)
+        if n < 2:
+            continue
+        claves = list(por_clave)
+        info = [por_clave[c] for c in claves]
+        A = _matriz(claves, [i[0] for i in info], fam, hay_empate)
+        familias += [(A, info, k, C, cota) for k, C, cota in _candidatos(A, n, info)]
+    total = sum(len(f[3]) for f in familias)
+    if total > MAX_COMBOS:
+        # recorte: solo los MAX_COMBOS combos con menor cota (los más cerca de arbitraje)
+        corte = np.partition(np.concatenate([f[4] for f in familias]), MAX_COMBOS - 1)[MAX_COMBOS - 1]
+        familias = [(A, info, k, C[cota <= corte], cota[cota <= corte]) for A, info, k, C, cota in familias]
+        metricas.contar("arbitraje.eventos_recortados")
+    sbs = []
+    for A, info, k, C, _ in familias:
+        paso = max(1, min(LOTE, CELDAS_SOLVE // (max(1, math.comb(A.shape[0], k)) * k * k)))
+        for i in range(0, len(C), paso):
+            lote = C[i:i + paso]
+            Ss, xs = _resolver(A[:, lote].transpose(1, 0, 2))
+            for combo, S, x in zip(lote, Ss, xs):
+                # sin arbitraje, o sobra una pata (ya sale con el combo sin ella)
+                if S >= 1.0 - EPS or (x <= EPS).any():
+                    continue
+                patas = [info[j] for j in combo]
+                sbs.append({
+                    "meta": meta,
+                    "mercado": "+".join(sorted({p[3] for p in patas})),
+                    "nombre": " + ".join(p[2] for p in patas),
+                    "linea": None,
+                    "precios": {f"{p[2]} ({p[3]})": round(p[0], 3) for p in patas},
+                    "patas": [{"nombre": p[2], "mercado": p[3], "linea": p[4], "cuota": round(p[0], 3),
+                               "casa": p[1], "stake": round(float(xi / S), 4)} for p, xi in zip(patas, x)],
+                    "retorno": round(1.0 / S, 4),
+                    "arb_margin": round(1.0 - S, 4),
+                })
+    return sbs
+
+
+def buscar(grupos):
+    """
+    grupos: iterable de (meta, mercado, linea, [(nombre, precios), ...]) con
+    precios = iterable de (cuota, casa). Se agrupan por meta["event_id"] y
+    cada evento se resuelve por separado.
+    Devuelve surebets entre mercados con el reparto de stakes, por margen descendente.
+    """
+    eventos = {}
+    for g in grupos:
+        eventos.setdefault(g[0].get("event_id"), []).append(g)
+    sbs = []
+    for grupos_ev in eventos.values():
+        sbs += _evento(grupos_ev)
+    sbs.sort(key=lambda s: s["arb_margin"], reverse=True)
+    return sbs
@@ -0,0 +1,145 @@
+# banks.py
+"""
+Bank por chat, servido desde memoria.
+
+- obtener(chat_id) / fijar(chat_id, cantidad): solo tocan un dict en RAM; el
+  stake de /value y de las alertas nunca lee disco.
+- Write-behind: los cambios quedan marcados como pendientes y un hilo los
+  vuelca en lote cada BANKS_FLUSH_SEG a SQLite (WAL: una escritura a medias
+  no corrompe nada; como mucho se pierden los últimos segundos). También
+  se vuelcan al salir (atexit).
+- Carga perezosa: la tabla entera se lee la primera vez que se pide un bank
+  (o antes, con precargar() en segundo plano al arrancar).
+Los chats sin bank propio usan el bank por defecto (chat_id None, guardado
+como chat 0): BANK_INICIAL o, si existe, el del bank.json global de
+versiones anteriores. BANKS_DB="" lo deja solo en memoria.
+"""
+import atexit, json, os, sqlite3, threading, time
+
+BANKS_DB = os.getenv("BANKS_DB", "banks.sqlite")
+FLUSH_SEG = float(os.getenv("BANKS_FLUSH_SEG", "2"))
+BANK_INICIAL = float(os.getenv("BANK_INICIAL", "1000"))
+BANK_JSON_ANTIGUO = "bank.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS banks (
+    chat_id INTEGER PRIMARY KEY,
+    bank    REAL NOT NULL,
+    ts      REAL NOT NULL
+);
+"""
+
+_lock = threading.Lock()
+_banks = None        # chat_id -> bank (None = aún sin cargar)
+_pendientes = {}     # chat_id -> bank aún no escrito
+_DEFECTO = 0         # chat_id del bank por defecto (Telegram nunca usa 0)
+_hay_cambios = threading.Event()
+_hilo = None
+
+
+def _conectar():
+    conn = sqlite3.connect(BANKS_DB, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _bank_antiguo():
+    try:
+        with open(BANK_JSON_ANTIGUO) as f:
+            return float(json.load(f).get("bank", BANK_INICIAL))
+    except (OSError, ValueError, TypeError, AttributeError):
+        return None
+
+
+def _cargar():
+    """Lee todos los banks una sola vez (con _lock tomado)."""
+    global _banks
+    if _banks is not None:
+        return
+    antiguo = _bank_antiguo()
+    banks = {_DEFECTO: BANK_INICIAL if antiguo is None else antiguo}
+    if BANKS_DB and os.path.exists(BANKS_DB):  # leer no crea el fichero; lo crea el primer volcado
+        try:
+            conn = _conectar()
+            try:
+                banks.update(conn.execute("SELECT chat_id, bank FROM banks"))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ No se pudieron cargar los banks de {BANKS_DB}: {e}")
+    _banks = banks
+
+
+def precargar():
+    """Carga los banks en un hilo aparte para que el primer /value no espere al disco."""
+    threading.Thread(target=obtener, args=(None,), name="banks-carga", daemon=True).start()
+
+
+def obtener(chat_id):
+    """Bank del chat (o el bank por defecto si no tiene / chat_id es None)."""
+    if _banks is None:
+        with _lock:
+            _cargar()
+    banks = _banks
+    return banks.get(_DEFECTO if chat_id is None else chat_id, banks[_DEFECTO])
+
+
+def fijar(chat_id, cantidad):
+    cantidad = float(cantidad)
+    chat_id = _DEFECTO if chat_id is None else chat_id
+    with _lock:
+        _cargar()
+        _banks[chat_id] = cantidad
+        _pendientes[chat_id] = cantidad
+    _arrancar_escritor()
+    _hay_cambios.set()
+
+
+def volcar():
+    """Escribe en lote los banks pendientes. Devuelve cuántos."""
+    with _lock:
+        lote = dict(_pendientes)
+        _pendientes.clear()
+    if not lote or not BANKS_DB:
+        return 0
+    ts = time.time()
+    try:
+        conn = _conectar()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO banks(chat_id, bank, ts) VALUES (?,?,?) "
+                    "ON CONFLICT(chat_id) DO UPDATE SET bank=excluded.bank, ts=excluded.ts",
+                    ((c, b, ts) for c, b in lote.items()),
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"⚠️ No se pudieron guardar {len(lote)} banks: {e}")
+        with _lock:
+            for c, b in lote.items():
+                _pendientes.setdefault(c, b)  # si entretanto hubo otro fijar(), gana el nuevo
+        return 0
+    return len(lote)
+
+
+def _escritor():
+    while True:
+        _hay_cambios.wait()
+        time.sleep(FLUSH_SEG)  # agrupa los cambios de la ventana en un solo lote
+        _hay_cambios.clear()
+        volcar()
+
+
+def _arrancar_escritor():
+    global _hilo
+    if _hilo is None and BANKS_DB:
+        with _lock:
+            if _hilo is None:
+                _hilo = threading.Thread(target=_escritor, name="banks-escritor", daemon=True)
+                _hilo.start()
+
+
+atexit.register(volcar)
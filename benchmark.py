@@ -0,0 +1,224 @@
+# benchmark.py
+"""
+Benchmark offline del pipeline (sin red ni créditos de la API).
+
+Genera un mundo sintético con simulacion.SimuladorOdds a varias escalas y
+mide tiempo (mínimo y mediana de N repeticiones, tras una de calentamiento)
+y pico de memoria (tracemalloc, en una pasada aparte) de:
+  - api_odds_ext.scan_all_markets (parseo en streaming + agrupación)
+  - api_odds.scan_and_group (el mismo scan + la vista {"meta", "outcomes"})
+  - cada función de selector_valor sobre esos grupos
+  - arbitraje.buscar aparte (solo la búsqueda entre mercados, sin adaptar
+    los grupos), con su coste por evento en el informe
+  - el formateo de apuestas (value, surebets, middles, alertas)
+
+Las respuestas /odds se sirven ya serializadas a JSON, así que el parseo
+entra en la medida igual que con la API real.
+
+Uso:
+  python benchmark.py                                   # escalas por defecto
+  python benchmark.py --escalas media,grande -r 5 --json bench_base.json
+  python benchmark.py --comparar bench_base.json         # marca regresiones
+Con --comparar el proceso sale con código 1 si algún caso empeora más que
+--umbral (tiempo mínimo o pico de memoria).
+"""
+import os
+os.environ.setdefault("HISTORIAL_DB", "")  # no escribir el histórico SQLite durante el benchmark
+
+import argparse, contextlib, datetime, gc, io, json, platform, statistics, sys, tempfile, time, tracemalloc
+
+from simulacion import SimuladorOdds
+from json_incremental import LectorArrayJSON
+import api_odds, api_odds_ext, arbitraje, selector_valor, apuestas
+
+ESCALAS = {
+    "pequena": dict(n_deportes=4, n_eventos=10, n_casas=6, n_alternativas=2),
+    "media": dict(n_deportes=12, n_eventos=25, n_casas=10, n_alternativas=3),
+    "grande": dict(n_deportes=30, n_eventos=40, n_casas=14, n_alternativas=5),
+}
+TROZO = 65536  # bytes por lectura simulada, como api_odds_cliente.STREAM_CHUNK
+
+
+@contextlib.contextmanager
+def _parche(obj, **attrs):
+    previos = {k: getattr(obj, k) for k in attrs}
+    for k, v in attrs.items():
+        setattr(obj, k, v)
+    try:
+        yield
+    finally:
+        for k, v in previos.items():
+            setattr(obj, k, v)
+
+
+@contextlib.contextmanager
+def fuente_sintetica(sim, dir_tmp):
+    """Conecta api_odds_ext (la única ingesta; api_odds deriva de ella) al simulador."""
+    textos = {}
+
+    def texto(sport_key, regions, markets):
+        k = (sport_key, regions, markets)
+        if k not in textos:
+            textos[k] = json.dumps(sim.odds(sport_key, regions, markets))
+        return textos[k]
+
+    def iter_odds(sport_key, regions, markets, *_):
+        t = texto(sport_key, regions, markets)
+        lector = LectorArrayJSON()
+        for i in range(0, len(t), TROZO):
+            yield from lector.alimentar(t[i:i + TROZO])
+        lector.cerrar()
+
+    with contextlib.ExitStack() as pila:
+        pila.enter_context(_parche(api_odds_ext, _get_sports=sim.sports, cargar_mercados_validos=dict,
+                                   _iter_odds=iter_odds, _cache_load=lambda *a: None,
+                                   CACHE_FILE=os.path.join(dir_tmp, "scan_cache.snap")))
+        yield
+
+
+def medir(fn, repeticiones):
+    """{"min_ms", "mediana_ms", "pico_mb"} de fn(), o {"error"} si falla."""
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()  # calentamiento
+            tiempos = []
+            for _ in range(repeticiones):
+                gc.collect()
+                t0 = time.perf_counter()
+                fn()
+                tiempos.append(time.perf_counter() - t0)
+            gc.collect()
+            tracemalloc.start()
+            try:
+                fn()
+                _, pico = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    return {"min_ms": round(min(tiempos) * 1000, 3),
+            "mediana_ms": round(statistics.median(tiempos) * 1000, 3),
+            "pico_mb": round(pico / 1e6, 3)}
+
+
+def correr_escala(nombre, params, repeticiones, seed, concurrencia):
+    sim = SimuladorOdds(seed=seed, **params)
+    casos = {}
+    with tempfile.TemporaryDirectory() as dir_tmp, fuente_sintetica(sim, dir_tmp):
+        casos["api_odds.scan_and_group"] = medir(api_odds.scan_and_group, repeticiones)
+        casos["api_odds_ext.scan_all_markets"] = medir(
+            lambda: api_odds_ext.scan_all_markets(concurrencia), repeticiones)
+        with contextlib.redirect_stdout(io.StringIO()):
+            payload = api_odds_ext.scan_all_markets(concurrencia)
+    g2, g3 = payload["groups_2way"], payload["groups_3way"]
+    tam = {**params, "grupos_2way": len(g2), "grupos_3way": len(g3),
+           "cuotas": sum(len(l) for g in (*g2.values(), *g3.values()) for l in g.lados),
+           "eventos": len({g.meta.get("event_id") for g in (*g2.values(), *g3.values())})}
+
+    sv = selector_valor
+    mb, em, cm = apuestas.MIN_BOOKS, apuestas.EDGE_MIN, apuestas.MIDDLE_COSTE_MAX
+    for fn, args in ((sv.build_two_way_candidates, (g2, mb, em)),
+                     (sv.build_three_way_candidates, (g3, mb, em)),
+                     (sv.detect_surebets_two_way, (g2,)),
+                     (sv.detect_surebets_three_way, (g3,)),
+                     (sv.detect_surebets_cruzados, (g2, g3)),
+                     (sv.indice_lineas, (g2,)),
+                     (sv.detect_middles, (g2, cm))):
+        casos[f"selector_valor.{fn.__name__}"] = medir(lambda: fn(*args), repeticiones)
+    lados = list(sv._iter_lados(g2, g3))
+    casos["arbitraje.buscar"] = medir(lambda: arbitraje.buscar(lados), repeticiones)
+
+    try:
+        values = sv.build_two_way_candidates(g2, mb, em) + sv.build_three_way_candidates(g3, mb, em)
+        sbs = sv.detect_surebets_two_way(g2) + sv.detect_surebets_three_way(g3) + sv.detect_surebets_cruzados(g2, g3)
+        mids = sv.detect_middles(g2, cm)
+    except Exception:
+        values, sbs, mids = [], [], []
+    with _parche(apuestas, _cache={"t": time.time(), "version": 1, "value": values, "surebets": sbs, "middles": mids}):
+        # con la lista explícita no pasa por la caché de render: mide el render en sí
+        casos["apuestas.format_values"] = medir(lambda: apuestas.format_values(20, values), repeticiones)
+        casos["apuestas.format_values (caché)"] = medir(lambda: apuestas.format_values(20), repeticiones)
+        casos["apuestas.format_surebets"] = medir(lambda: apuestas.format_surebets(20, sbs), repeticiones)
+        casos["apuestas.format_middles"] = medir(lambda: apuestas.format_middles(20, mids), repeticiones)
+        casos["apuestas.format_alertas"] = medir(
+            lambda: apuestas.format_alertas(values[:apuestas.ALERT_MAX], sbs[:apuestas.ALERT_MAX]), repeticiones)
+    return {"tamano": tam, "casos": casos}
+
+
+def informe(res, base=None, umbral=0.10):
+    """Texto del informe; con `base` añade la variación y marca regresiones. Devuelve (texto, nº regresiones)."""
+    lineas, regresiones = [], 0
+    m = res["meta"]
+    lineas.append(f"🧪 Benchmark {m['fecha']} | Python {m['python']} | numpy: {m['numpy']} | "
+                  f"seed {m['seed']} | {m['repeticiones']} rep.")
+    for esc, r in res["escalas"].items():
+        t = r["tamano"]
+        lineas.append(f"\n== {esc}: {t['n_deportes']} deportes × {t['n_eventos']} eventos × {t['n_casas']} casas, "
+                      f"{t['n_alternativas']} alt. → {t['cuotas']} cuotas, {t['grupos_2way']}+{t['grupos_3way']} grupos")
+        cab = f"{'caso':<44}{'min ms':>11}{'mediana ms':>12}{'pico MB':>10}"
+        lineas.append(cab + ("  vs base" if base else ""))
+        casos_base = (base or {}).get("escalas", {}).get(esc, {}).get("casos", {})
+        for caso, c in r["casos"].items():
+            if "error" in c:
+                lineas.append(f"{caso:<44}  ❌ {c['error']}")
+                continue
+            fila = f"{caso:<44}{c['min_ms']:>11.2f}{c['mediana_ms']:>12.2f}{c['pico_mb']:>10.2f}"
+            b = casos_base.get(caso)
+            if b and "error" not in b:
+                dt = c["min_ms"] / b["min_ms"] - 1 if b["min_ms"] else 0.0
+                dm = c["pico_mb"] / b["pico_mb"] - 1 if b["pico_mb"] else 0.0
+                fila += f"  t {dt:+.0%} mem {dm:+.0%}"
+                if dt > umbral or dm > umbral:
+                    fila += "  ⚠️ REGRESIÓN"
+                    regresiones += 1
+            elif base:
+                fila += "  (nuevo)"
+            lineas.append(fila)
+        arb = r["casos"].get("arbitraje.buscar", {})
+        if t.get("eventos") and "min_ms" in arb:
+            lineas.append(f"   arbitraje entre mercados: {arb['min_ms'] / t['eventos']:.2f} ms/evento "
+                          f"sobre {t['eventos']} eventos, pico {arb['pico_mb']:.2f} MB")
+    return "\n".join(lineas), regresiones
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark offline de BetBot con payloads sintéticos.")
+    ap.add_argument("--escalas", default="pequena,media", help=f"lista separada por comas de {', '.join(ESCALAS)}")
+    ap.add_argument("-r", "--repeticiones", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--concurrencia", type=int, default=1, help="hilos de api_odds_ext (1 = solo CPU de agrupación)")
+    ap.add_argument("--sin-numpy", action="store_true", help="medir el camino Python puro de selector_valor")
+    ap.add_argument("--json", help="guardar el resultado en este fichero")
+    ap.add_argument("--comparar", help="resultado JSON anterior con el que comparar")
+    ap.add_argument("--umbral", type=float, default=0.10, help="empeoramiento relativo que cuenta como regresión")
+    args = ap.parse_args(argv)
+
+    if args.sin_numpy:
+        selector_valor.motor_valor = None
+    escalas = [e.strip() for e in args.escalas.split(",") if e.strip()]
+    desconocidas = [e for e in escalas if e not in ESCALAS]
+    if desconocidas:
+        ap.error(f"escalas desconocidas: {', '.join(desconocidas)}")
+
+    res = {"meta": {"fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(), "numpy": selector_valor.motor_valor is not None,
+                    "seed": args.seed, "repeticiones": args.repeticiones, "concurrencia": args.concurrencia},
+           "escalas": {}}
+    for e in escalas:
+        print(f"⏱️ Escala {e}...", file=sys.stderr)
+        res["escalas"][e] = correr_escala(e, ESCALAS[e], args.repeticiones, args.seed, args.concurrencia)
+
+    base = None
+    if args.comparar:
+        with open(args.comparar) as f:
+            base = json.load(f)
+    texto, regresiones = informe(res, base, args.umbral)
+    print(texto)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(res, f, indent=1)
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
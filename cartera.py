@@ -0,0 +1,104 @@
+# cartera.py
+"""
+Stakes de cartera: Kelly simultáneo para todos los picks que se van a
+apostar a la vez, en lugar de un Kelly independiente por pick.
+
+- Los picks de un mismo grupo (evento, mercado, línea) son resultados
+  mutuamente excluyentes: como mucho gana uno. Para cada grupo se resuelve
+  el Kelly exacto de resultados excluyentes (Smoczynski & Tomkins): se
+  ordenan por p·cuota, se añaden mientras p·cuota > R del conjunto previo,
+  con R = (1 − Σp) / (1 − Σ1/cuota), y f_i = p_i − R / cuota_i.
+- Todo por lotes con NumPy (lexsort + sumas acumuladas por segmento), sin
+  bucles por grupo: unos cientos de picks se resuelven en microsegundos.
+- Después, Kelly fraccional y topes en este orden: por pick, por evento
+  (mercados distintos del mismo partido están correlacionados), por casa y
+  total. Cada tope solo escala hacia abajo, así que al final se cumplen
+  todos. Los stakes por debajo del mínimo quedan en 0 (fuera de cartera).
+Devuelve fracciones del bank, alineadas con la lista de picks.
+"""
+try:
+    import numpy as np
+except ImportError:  # sin NumPy: Kelly independiente recortado por pick
+    np = None
+
+from utils_valor import kelly_fraction
+
+
+def _ids(claves):
+    ids = {}
+    return [ids.setdefault(k, len(ids)) for k in claves], len(ids)
+
+
+def _escalar(f, ids, n, tope):
+    """Escala hacia abajo cada conjunto de `ids` cuya suma pase de `tope`."""
+    sumas = np.bincount(ids, weights=f, minlength=n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = np.where(sumas > tope, tope / sumas, 1.0)
+    return f * factor[ids]
+
+
+def kelly_excluyente(p, cuota, grupo):
+    """
+    Kelly completo por grupo de resultados excluyentes.
+    p, cuota, grupo: arrays alineados (grupo = id entero). Devuelve f >= 0.
+    """
+    n = len(p)
+    if not n:
+        return np.zeros(0)
+    orden = np.lexsort((-p * cuota, grupo))
+    ps, os_, gs = p[orden], cuota[orden], grupo[orden]
+    nuevo = np.ones(n, dtype=bool)
+    nuevo[1:] = gs[1:] != gs[:-1]
+    seg = np.cumsum(nuevo) - 1
+    inicios = np.flatnonzero(nuevo)
+
+    def acumulado(x):  # suma acumulada reiniciada en cada grupo
+        c = np.cumsum(x)
+        return c - (c - x)[inicios][seg]
+
+    cp = acumulado(ps)
+    ci = acumulado(1.0 / os_)
+    den = 1.0 - ci
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Σ1/cuota >= 1 ya no se alcanza con apuestas de valor; si no (arbitraje) R = 0
+        R = np.where(den > 1e-12, np.maximum(1.0 - cp, 0.0) / den, 0.0)
+    R_previo = np.empty(n)
+    R_previo[0] = 1.0
+    R_previo[1:] = R[:-1]
+    R_previo[nuevo] = 1.0
+    # se incluye el prefijo del grupo mientras p·cuota supere el R previo
+    fallos = acumulado((ps * os_ <= R_previo).astype(np.float64))
+    dentro = fallos == 0
+    n_dentro = np.bincount(seg, weights=dentro, minlength=len(inicios)).astype(np.int64)
+    R_final = np.where(n_dentro > 0, R[inicios + np.maximum(n_dentro, 1) - 1], 1.0)
+    f = np.where(dentro, ps - R_final[seg] / os_, 0.0)
+    out = np.empty(n)
+    out[orden] = np.maximum(f, 0.0)
+    return out
+
+
+def fracciones(picks, fraccion=0.25, max_pick=0.02, max_evento=0.05, max_casa=0.15,
+               max_total=0.30, min_pick=0.002):
+    """Fracción del bank para cada pick ({meta, casa, cuota, p_fair, ...}) como cartera."""
+    if not picks:
+        return []
+    if np is None:
+        fs = [min(max_pick, fraccion * kelly_fraction(v["p_fair"], float(v["cuota"]) - 1.0, 1.0)) for v in picks]
+        return [f if f >= min_pick else 0.0 for f in fs]
+
+    metas = [v.get("meta", {}) for v in picks]
+    grupo, _ = _ids((m.get("event_id"), m.get("mercado"), m.get("linea")) for m in metas)
+    evento, n_ev = _ids(m.get("event_id") for m in metas)
+    casa, n_casas = _ids(v.get("casa") for v in picks)
+    p = np.fromiter((v["p_fair"] for v in picks), np.float64, len(picks))
+    cuota = np.fromiter((v["cuota"] for v in picks), np.float64, len(picks))
+
+    f = kelly_excluyente(p, cuota, np.asarray(grupo)) * fraccion
+    np.minimum(f, max_pick, out=f)
+    f = _escalar(f, np.asarray(evento), n_ev, max_evento)
+    f = _escalar(f, np.asarray(casa), n_casas, max_casa)
+    total = f.sum()
+    if total > max_total:
+        f *= max_total / total
+    f[f < min_pick] = 0.0
+    return f.tolist()
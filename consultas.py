@@ -0,0 +1,151 @@
+# consultas.py
+"""
+Consultas parametrizadas sobre los candidatos del último scan, en memoria.
+
+El scan guarda todos los candidatos por encima de un suelo (CONSULTA_EDGE_MIN,
+CONSULTA_MIN_BOOKS en apuestas), no solo los que pasan EDGE_MIN/MIN_BOOKS, y
+TablaCandidatos los indexa por deporte, mercado, casa y hora de inicio:
+  /value sport=tennis edge=0.04 books=4 within=6h sin=pinnacle
+Se parte del índice más selectivo, el resto de condiciones se comprueban
+fila a fila y el top-K sale con un heap: las listas de cada índice ya están
+en orden de ranking (heapq.merge + corte) y la del índice por hora se
+resuelve con heapq.nsmallest, nunca con un sort completo.
+La casa es la de la mejor cuota del candidato: sin=pinnacle descarta los
+picks cuya mejor cuota está en Pinnacle.
+"""
+import bisect, datetime, heapq, re, time
+from collections import defaultdict
+from itertools import islice
+
+N_MAX = 50
+
+_CLAVES = {
+    "sport": "deporte", "deporte": "deporte",
+    "market": "mercado", "mercado": "mercado",
+    "book": "casa", "casa": "casa",
+    "exclude": "sin", "sin": "sin",
+    "edge": "edge",
+    "books": "books", "casas": "books",
+    "within": "within", "en": "within",
+    "n": "n", "top": "n",
+    "p": "pagina", "page": "pagina", "pagina": "pagina",
+}
+_DURACION = re.compile(r"^(\d+(?:\.\d+)?)([mhd]?)$")
+_SEGUNDOS = {"m": 60, "h": 3600, "d": 86400, "": 3600}
+
+
+def _lista(v):
+    return {x.strip().lower() for x in v.split(",") if x.strip()}
+
+
+def parsear(args):
+    """
+    ["sport=tennis", "edge=4%", ...] -> dict de condiciones.
+    Lanza ValueError con un mensaje para el usuario si algo no se entiende.
+    """
+    c = {}
+    for arg in args:
+        k, sep, v = arg.partition("=")
+        clave = _CLAVES.get(k.strip().lower())
+        v = v.strip()
+        if not sep or clave is None or not v:
+            raise ValueError(f"no entiendo {arg!r}; usa clave=valor con: sport, market, book, sin, edge, books, within, n, p")
+        try:
+            if clave == "edge":
+                c["edge"] = float(v[:-1]) / 100 if v.endswith("%") else float(v)
+            elif clave in ("books", "n", "pagina"):
+                c[clave] = int(v)
+            elif clave == "within":
+                m = _DURACION.match(v.lower())
+                if not m:
+                    raise ValueError
+                c["within"] = float(m.group(1)) * _SEGUNDOS[m.group(2)]
+            else:
+                c[clave] = _lista(v)
+        except ValueError:
+            raise ValueError(f"valor no válido en {arg!r}") from None
+    if "n" in c:
+        c["n"] = max(1, min(N_MAX, c["n"]))
+    if "pagina" in c:
+        c["pagina"] = max(1, c["pagina"])
+    return c
+
+
+def _ts(hora, cache):
+    t = cache.get(hora)
+    if t is None:
+        try:
+            t = datetime.datetime.fromisoformat(str(hora).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            t = float("inf")
+        cache[hora] = t
+    return t
+
+
+class TablaCandidatos:
+    """Candidatos en orden de ranking + índices secundarios (listas de filas ascendentes)."""
+
+    def __init__(self, picks):
+        self.picks = picks
+        self.filas = []  # (sport_key, mercado, casa, inicio, edge, books) por fila
+        self.titulos = {}
+        self.por_deporte = defaultdict(list)
+        self.por_mercado = defaultdict(list)
+        self.por_casa = defaultdict(list)
+        horas = {}
+        for i, p in enumerate(picks):
+            m = p.get("meta", {})
+            sk, mk, casa = m.get("sport_key", ""), m.get("mercado", ""), p.get("casa", "").lower()
+            t = _ts(m.get("hora"), horas)
+            self.filas.append((sk, mk, casa, t, p["edge"], p.get("books", 0)))
+            self.titulos.setdefault(sk, (m.get("deporte") or "").lower())
+            self.por_deporte[sk].append(i)
+            self.por_mercado[mk].append(i)
+            self.por_casa[casa].append(i)
+        # índice por hora de inicio: filas ordenadas por t, con las t aparte para bisect
+        self.por_inicio = sorted(range(len(picks)), key=lambda i: self.filas[i][3])
+        self.inicios = [self.filas[i][3] for i in self.por_inicio]
+
+    def __len__(self):
+        return len(self.picks)
+
+    def _deportes(self, terminos):
+        return {sk for sk, titulo in self.titulos.items()
+                if any(t in sk.lower() or t in titulo for t in terminos)}
+
+    def consultar(self, c, n=5, ahora=None):
+        """Los n mejores candidatos (en orden de ranking) que cumplen la consulta `c` (ver parsear)."""
+        n = c.get("n", n)
+        deportes = self._deportes(c["deporte"]) if "deporte" in c else None
+        mercados, casas, sin = c.get("mercado"), c.get("casa"), c.get("sin") or ()
+        edge_min, books_min = c.get("edge", float("-inf")), c.get("books", 0)
+        t0 = t1 = None
+        if "within" in c:
+            t0 = time.time() if ahora is None else ahora
+            t1 = t0 + c["within"]
+
+        def cumple(i):
+            sk, mk, casa, t, edge, books = self.filas[i]
+            return (edge >= edge_min and books >= books_min and casa not in sin
+                    and (deportes is None or sk in deportes)
+                    and (mercados is None or mk in mercados)
+                    and (casas is None or casa in casas)
+                    and (t0 is None or t0 <= t <= t1))
+
+        # índice más selectivo: (nº filas, listas en orden de ranking | None si es el de hora)
+        opciones = [(len(self.picks), [range(len(self.picks))])]
+        for filtro, indice in ((deportes, self.por_deporte), (mercados, self.por_mercado), (casas, self.por_casa)):
+            if filtro is not None:
+                listas = [indice[k] for k in filtro if k in indice]
+                opciones.append((sum(map(len, listas)), listas))
+        if t0 is not None:
+            lo = bisect.bisect_left(self.inicios, t0)
+            hi = bisect.bisect_right(self.inicios, t1)
+            opciones.append((hi - lo, None))
+        _, listas = min(opciones, key=lambda o: o[0])
+
+        if listas is None:
+            filas = heapq.nsmallest(n, filter(cumple, self.por_inicio[lo:hi]))
+        else:
+            filas = islice(filter(cumple, heapq.merge(*listas)), n)
+        return [self.picks[i] for i in filas]
@@ -0,0 +1,110 @@
+# devig.py
+"""
+Quitar el margen (vig) de las cuotas, por lotes con NumPy.
+
+Entrada: matriz Pi (R × k) de probabilidades implícitas 1/cuota, una fila
+por casa que cotiza todos los lados de un grupo (overround O = Σ fila).
+Métodos, aplicados a todas las filas a la vez:
+  multiplicativo  p = π / O
+  aditivo         p = π − (O − 1)/k                 (recortado y renormalizado)
+  potencia        p = π^x con Σ π^x = 1             (Newton; f convexa -> monótono)
+  shin            p(z) de Shin (1993) con Σ p = 1   (bisección en z ∈ [0, 1))
+Las filas de cada grupo se juntan con consenso(): media ponderada por casa
+(DEVIG_PESOS, p.ej. "Pinnacle:3,Betfair:2"), así una casa afilada cuenta
+más que una blanda. Casas no listadas pesan 1.
+
+"media" es el cálculo anterior (media de 1/cuota por lado, normalizada) y
+no necesita filas por casa; motor_valor lo usa también como respaldo en
+grupos donde ninguna casa cotiza todos los lados.
+"""
+import os
+import numpy as np
+
+METODOS = ("media", "multiplicativo", "aditivo", "potencia", "shin")
+
+
+def _leer_pesos(txt):
+    pesos = {}
+    for par in filter(None, (p.strip() for p in txt.split(","))):
+        casa, _, w = par.rpartition(":")
+        try:
+            pesos[casa.strip()] = float(w)
+        except ValueError:
+            print(f"⚠️ DEVIG_PESOS: peso no válido en {par!r}")
+    return pesos
+
+PESOS_CASAS = _leer_pesos(os.getenv(
+    "DEVIG_PESOS", "Pinnacle:3,Betfair:2,Betfair Exchange:2,Matchbook:2,Smarkets:2"))
+
+
+def peso(casa):
+    return PESOS_CASAS.get(casa, 1.0)
+
+
+def multiplicativo(Pi):
+    return Pi / Pi.sum(axis=1, keepdims=True)
+
+
+def aditivo(Pi):
+    k = Pi.shape[1]
+    P = Pi - (Pi.sum(axis=1, keepdims=True) - 1.0) / k
+    np.maximum(P, 1e-6, out=P)
+    return P / P.sum(axis=1, keepdims=True)
+
+
+def potencia(Pi, iteraciones=30, tol=1e-12):
+    lnP = np.log(Pi)
+    x = np.ones((len(Pi), 1))
+    for _ in range(iteraciones):
+        Px = np.exp(lnP * x)
+        f = Px.sum(axis=1, keepdims=True) - 1.0
+        if not len(f) or np.abs(f).max() < tol:
+            break
+        x -= f / (Px * lnP).sum(axis=1, keepdims=True)
+    P = np.exp(lnP * x)
+    return P / P.sum(axis=1, keepdims=True)
+
+
+def _shin_p(z, c):
+    return (np.sqrt(z * z + 4.0 * (1.0 - z) * c) - z) / (2.0 * (1.0 - z))
+
+
+def shin(Pi, iteraciones=45):
+    O = Pi.sum(axis=1, keepdims=True)
+    c = Pi * Pi / O
+    lo = np.zeros_like(O)
+    hi = np.full_like(O, 0.999)
+    # Σ p(z) decrece con z: en z=0 vale √O (>1 si hay margen)
+    for _ in range(iteraciones):
+        z = 0.5 * (lo + hi)
+        mayor = _shin_p(z, c).sum(axis=1, keepdims=True) > 1.0
+        lo = np.where(mayor, z, lo)
+        hi = np.where(mayor, hi, z)
+    z = np.where(O > 1.0, 0.5 * (lo + hi), 0.0)  # sin margen no hay nada que quitar
+    P = _shin_p(z, c)
+    return P / P.sum(axis=1, keepdims=True)
+
+
+_FUNCIONES = {"multiplicativo": multiplicativo, "aditivo": aditivo, "potencia": potencia, "shin": shin}
+
+
+def quitar_margen(Pi, metodo):
+    """Probabilidades justas por fila (R × k) con el método indicado."""
+    return _FUNCIONES[metodo](Pi)
+
+
+def consenso(P, grupo, pesos, G):
+    """
+    Media ponderada por grupo de las filas de P (R × k); grupo[r] es el
+    grupo de la fila r. Devuelve (G × k), renormalizado; NaN si el grupo no
+    tiene filas.
+    """
+    k = P.shape[1]
+    W = np.bincount(grupo, weights=pesos, minlength=G)
+    out = np.empty((G, k))
+    for j in range(k):
+        out[:, j] = np.bincount(grupo, weights=P[:, j] * pesos, minlength=G)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out /= W[:, None]
+        out /= out.sum(axis=1, keepdims=True)
+    return out
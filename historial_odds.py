@@ -0,0 +1,142 @@
+# historial_odds.py
+"""
+Histórico de cuotas en SQLite (embebido, sin servicios externos).
+
+Cada scan añade sus cuotas normalizadas:
+  quotes(ts, event_id, market, line, outcome, bookmaker, price)
+con índices por (event_id, market, line) y (bookmaker, ts), para consultas
+tipo "¿cómo estaba esta línea hace una hora?" sin guardar scans en RAM.
+
+Retención / compactación (automática cada HISTORIAL_COMPACTAR_SEG):
+  - se borran las filas más viejas que HISTORIAL_RETENCION_H
+  - en filas con más de HISTORIAL_DEDUP_H se eliminan las repeticiones
+    consecutivas del mismo precio (se conserva la primera de cada racha), así
+    "precio en el instante t" sigue siendo exacto con muchas menos filas.
+"""
+import os, sqlite3, threading, time
+
+HISTORIAL_DB = os.getenv("HISTORIAL_DB", "odds_historial.sqlite")  # "" desactiva
+RETENCION_H = float(os.getenv("HISTORIAL_RETENCION_H", "72"))
+DEDUP_H = float(os.getenv("HISTORIAL_DEDUP_H", "1"))
+COMPACTAR_SEG = int(os.getenv("HISTORIAL_COMPACTAR_SEG", "3600"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    ts        REAL NOT NULL,
+    event_id  TEXT NOT NULL,
+    market    TEXT NOT NULL,
+    line      REAL,
+    outcome   TEXT NOT NULL,
+    bookmaker TEXT NOT NULL,
+    price     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_quotes_linea ON quotes(event_id, market, line);
+CREATE INDEX IF NOT EXISTS ix_quotes_casa ON quotes(bookmaker, ts);
+CREATE INDEX IF NOT EXISTS ix_quotes_ts ON quotes(ts);
+"""
+
+_lock = threading.Lock()
+_conn = None
+_ultima_compactacion = 0.0
+
+
+def activo():
+    return bool(HISTORIAL_DB)
+
+
+def _conectar():
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(HISTORIAL_DB, check_same_thread=False)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # solo surte efecto en una BD nueva
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _conn = conn
+    return _conn
+
+
+def guardar_quotes(filas, ts=None):
+    """
+    Inserta en bloque las filas (event_id, market, line, outcome, bookmaker, price)
+    de un scan, todas con el mismo ts. Devuelve cuántas se escribieron.
+    """
+    global _ultima_compactacion
+    if not activo() or not filas:
+        return 0
+    ts = time.time() if ts is None else ts
+    with _lock:
+        conn = _conectar()
+        with conn:
+            conn.executemany(
+                "INSERT INTO quotes(ts, event_id, market, line, outcome, bookmaker, price) VALUES (?,?,?,?,?,?,?)",
+                ((ts, *f) for f in filas),
+            )
+        if ts - _ultima_compactacion >= COMPACTAR_SEG:
+            _compactar(conn, ts)
+            _ultima_compactacion = ts
+    return len(filas)
+
+
+def precios_en(event_id, market, line, outcome, instante):
+    """{bookmaker: precio} vigente en `instante` (epoch) para una selección."""
+    if not activo():
+        return {}
+    with _lock:
+        rows = _conectar().execute(
+            "SELECT bookmaker, price, MAX(ts) FROM quotes "
+            "WHERE event_id=? AND market=? AND line IS ? AND outcome=? AND ts<=? "
+            "GROUP BY bookmaker",
+            (event_id, market, line, outcome, instante),
+        ).fetchall()
+    return {casa: price for casa, price, _ in rows}
+
+
+def precios_hace(event_id, market, line, outcome, segundos):
+    """Atajo: precios de la selección hace `segundos` (p.ej. 3600 = hace una hora)."""
+    return precios_en(event_id, market, line, outcome, time.time() - segundos)
+
+
+def historia_linea(event_id, market, line, desde=None):
+    """Todas las filas (ts, outcome, bookmaker, price) de una línea, por orden temporal."""
+    if not activo():
+        return []
+    with _lock:
+        return _conectar().execute(
+            "SELECT ts, outcome, bookmaker, price FROM quotes "
+            "WHERE event_id=? AND market=? AND line IS ? AND ts>=? ORDER BY ts",
+            (event_id, market, line, desde or 0.0),
+        ).fetchall()
+
+
+def historia_casa(bookmaker, desde, hasta=None):
+    if not activo():
+        return []
+    with _lock:
+        return _conectar().execute(
+            "SELECT ts, event_id, market, line, outcome, price FROM quotes "
+            "WHERE bookmaker=? AND ts BETWEEN ? AND ? ORDER BY ts",
+            (bookmaker, desde, hasta or time.time()),
+        ).fetchall()
+
+
+def compactar(ahora=None):
+    if not activo():
+        return
+    with _lock:
+        _compactar(_conectar(), ahora or time.time())
+
+
+def _compactar(conn, ahora):
+    with conn:
+        conn.execute("DELETE FROM quotes WHERE ts < ?", (ahora - RETENCION_H * 3600,))
+        conn.execute(
+            "DELETE FROM quotes WHERE rowid IN ("
+            " SELECT rid FROM ("
+            "  SELECT rowid AS rid, price, LAG(price) OVER ("
+            "   PARTITION BY event_id, market, line, outcome, bookmaker ORDER BY ts) AS prev"
+            "  FROM quotes WHERE ts < ?)"
+            " WHERE prev = price)",
+            (ahora - DEDUP_H * 3600,),
+        )
+    conn.execute("PRAGMA incremental_vacuum")
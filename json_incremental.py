@@ -0,0 +1,70 @@
+# json_incremental.py
+"""
+Parser incremental para respuestas JSON con forma de array ([{...}, {...}]).
+
+Se le van pasando trozos de texto según llegan de la red y entrega cada
+elemento en cuanto está completo, sin tener nunca la respuesta entera en
+memoria ni construir el árbol completo. Si la respuesta no es un array
+(p.ej. un {"message": ...} de error) se acumula y se entrega al final.
+"""
+import json
+
+
+class LectorArrayJSON:
+    def __init__(self):
+        self._dec = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._estado = "inicio"   # inicio -> elemento <-> separador -> fin | "otro"
+
+    def alimentar(self, texto):
+        """Añade texto y genera los elementos completos que haya."""
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        self._buf += texto
+        buf = self._buf
+        n = len(buf)
+        while True:
+            i = self._pos
+            while i < n and buf[i] in " \t\r\n":
+                i += 1
+            self._pos = i
+            if i >= n or self._estado in ("fin", "otro"):
+                return
+            c = buf[i]
+            if self._estado == "inicio":
+                if c == "[":
+                    self._estado, self._pos = "elemento", i + 1
+                else:
+                    self._estado = "otro"
+                continue
+            if self._estado == "separador":
+                if c == ",":
+                    self._estado, self._pos = "elemento", i + 1
+                elif c == "]":
+                    self._estado, self._pos = "fin", i + 1
+                else:
+                    raise ValueError(f"JSON inválido en la posición {i}: {c!r}")
+                continue
+            # estado "elemento"
+            if c == "]":
+                self._estado, self._pos = "fin", i + 1
+                continue
+            try:
+                obj, fin = self._dec.raw_decode(buf, i)
+            except json.JSONDecodeError:
+                return  # elemento incompleto: esperar más texto
+            if fin >= n and not isinstance(obj, (dict, list)):
+                return  # un número/literal al borde puede seguir en el siguiente trozo
+            self._pos = fin
+            self._estado = "separador"
+            yield obj
+
+    def cerrar(self):
+        """Fin del flujo: devuelve lo no-array (si lo hubo) o falla si quedó a medias."""
+        if self._estado == "otro":
+            return json.loads(self._buf[self._pos:])
+        if self._estado not in ("fin", "inicio"):
+            raise ValueError("respuesta JSON truncada")
+        return None
@@ -1,11 +1,22 @@
 import os
 import asyncio
+import functools
 import logging
 from telegram import Update
+from telegram.error import Forbidden
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
 
 # Importar funciones desde apuestas.py
-from apuestas import scan, format_values, format_surebets, format_middles, get_bank, set_bank
+from apuestas import (
+    scan, arranque_en_caliente, cache_edad, cache_fresca, CACHE_TTL_SEC,
+    format_values, format_consulta, format_surebets, format_middles, format_moves, format_alertas, get_bank, set_bank,
+    get_suscriptores, suscribir, desuscribir, picks_nuevos, marcar_enviados,
+)
+from consultas import parsear
+from render import partir, PARSE_MODE
+from utils_valor import esc_md
+from api_odds_cliente import cliente
+import metricas, banks
 
 # Configuración del logging
 logging.basicConfig(level=logging.INFO)
@@ -14,6 +25,10 @@ logging.basicConfig(level=logging.INFO)
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")
 PORT = int(os.environ.get("PORT", 5000))
+SCAN_INTERVAL_SEC = int(os.getenv("SCAN_INTERVAL_SEC", str(CACHE_TTL_SEC)))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = sin endpoint de métricas (por defecto)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # sin auth: solo local salvo que se pida
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
 
 if not TOKEN:
     raise ValueError("❌ ERROR: La variable TELEGRAM_BOT_TOKEN no está definida.")
@@ -31,90 +46,247 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "👋 Bienvenido al bot profesional de apuestas.\n"
         "Comandos disponibles:\n"
         "💰 /value → Muestra apuestas con valor esperado positivo.\n"
+        "   Filtros: /value sport=tennis edge=0.04 books=4 within=6h sin=pinnacle n=10\n"
+        "   Páginas: /value p=2 (también en /surebets y /middles)\n"
         "🔀 /surebets → Muestra oportunidades de arbitraje.\n"
         "🎯 /middles → Muestra oportunidades de middles.\n"
+        "📉 /moves → Steam moves, casas rezagadas y mayores movimientos.\n"
         "🏦 /bank → Consulta el bank actual.\n"
-        "📈 /setbank <cantidad> → Configura el bank."
+        "📈 /setbank <cantidad> → Configura el bank.\n"
+        "🔔 /subscribe → Recibe alertas de value bets y surebets nuevas.\n"
+        "🔕 /unsubscribe → Deja de recibir alertas."
     )
 
-# /value
-async def value(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("🔍 Buscando value bets...")
+async def _enviar(enviar, texto):
+    """Envía `texto` (MarkdownV2) troceado en mensajes de como mucho 4096 caracteres."""
+    with metricas.cronometro("telegram.envio_ms"):
+        for parte in partir(texto):
+            await enviar(parte, parse_mode=PARSE_MODE)
 
-    async def tarea():
+# ---- Scans fuera del event loop, uno solo a la vez (single-flight) ----
+_scan_en_curso = None  # asyncio.Task del scan que está corriendo
+# corutinas que reciben los resultados de cada deporte en cuanto el scan lo
+# termina (alertas push, primeras respuestas mientras no hay caché)
+_oyentes = set()
+
+def _fin_scan(tarea):
+    if not tarea.cancelled() and tarea.exception():
+        logging.error("❌ Scan fallido: %s", tarea.exception())
+
+async def _repartir(parcial):
+    for oyente in list(_oyentes):
         try:
-            apuestas = scan("value")
-            if not apuestas:
-                await update.message.reply_text("❌ No se encontraron value bets.")
-            else:
-                texto = format_values(apuestas)
-                await update.message.reply_text(texto, parse_mode="Markdown")
+            await oyente(parcial)
         except Exception as e:
-            await update.message.reply_text(f"❌ Error en /value: {e}")
+            logging.warning("⚠️ Error enviando resultados de %s: %s", parcial.get("sport_key"), e)
 
-    asyncio.create_task(tarea())
+def _refrescar():
+    """Devuelve el scan en curso o lanza uno nuevo en un hilo aparte."""
+    global _scan_en_curso
+    if _scan_en_curso is None or _scan_en_curso.done():
+        loop = asyncio.get_running_loop()
 
-# /surebets
-async def surebets(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("🔍 Buscando surebets...")
+        def al_deporte(parcial):  # corre en el hilo del scan
+            asyncio.run_coroutine_threadsafe(_repartir(parcial), loop)
+
+        _scan_en_curso = asyncio.create_task(asyncio.to_thread(scan, al_deporte))
+        _scan_en_curso.add_done_callback(_fin_scan)
+    return _scan_en_curso
+
+async def _resultados():
+    """
+    Stale-while-revalidate: si hay resultados previos se responde con ellos
+    al momento (y, si están caducados, se refresca en segundo plano). Solo
+    se espera al scan cuando todavía no hay ningún resultado.
+    """
+    if cache_fresca():
+        return
+    tarea = _refrescar()
+    if cache_edad() is None:
+        await asyncio.shield(tarea)
+
+async def _responder(update: Update, comando: str, que: str, formatter, clave: str):
+    adelanto = None
+    if cache_edad() is None:
+        await update.message.reply_text(f"🔍 Buscando {que}...")
+
+        # sin caché hay que esperar al scan: se adelanta el primer deporte
+        # que tenga algo mientras siguen los demás
+        async def adelanto(parcial):
+            if not parcial[clave] or adelanto not in _oyentes:
+                return
+            _oyentes.discard(adelanto)
+            with metricas.cronometro("telegram.formato_ms"):
+                texto = (esc_md(f"⏳ Primeros resultados ({parcial['deporte']}), el scan continúa:\n\n")
+                         + formatter(5, parcial[clave]))
+            await _enviar(update.message.reply_text, texto)
+
+        _oyentes.add(adelanto)
 
     async def tarea():
         try:
-            apuestas = scan("surebets")
-            if not apuestas:
-                await update.message.reply_text("❌ No se encontraron surebets.")
-            else:
-                texto = format_surebets(apuestas)
-                await update.message.reply_text(texto, parse_mode="Markdown")
+            await _resultados()
+            _oyentes.discard(adelanto)
+            with metricas.cronometro("telegram.formato_ms"):
+                texto = formatter()
+            await _enviar(update.message.reply_text, texto)
         except Exception as e:
-            await update.message.reply_text(f"❌ Error en /surebets: {e}")
+            _oyentes.discard(adelanto)
+            await update.message.reply_text(f"❌ Error en /{comando}: {e}")
 
     asyncio.create_task(tarea())
 
-# /middles
+async def _consulta(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Argumentos del comando como consulta (consultas.parsear); None si no valen (ya respondido)."""
+    try:
+        return parsear(context.args or [])
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}\nEjemplo: /value sport=tennis edge=0.04 books=4 within=6h p=2")
+        return None
+
+def _paginado(format_fn, consulta, **kw):
+    n, pagina = consulta.get("n", 5), consulta.get("pagina", 1)
+    return lambda n_=n, lista=None: format_fn(n_, lista, pagina, **kw)
+
+# /value [sport=.. market=.. book=.. sin=.. edge=.. books=.. within=.. n=.. p=..]
+async def value(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    consulta = await _consulta(update, context)
+    if consulta is None:
+        return
+    chat_id = update.effective_chat.id
+    if consulta.keys() <= {"n", "pagina"}:
+        await _responder(update, "value", "value bets", _paginado(format_values, consulta, chat_id=chat_id), "value")
+    else:
+        await _responder(update, "value", "value bets",
+                         lambda n=None, values=None: format_consulta(consulta, values, chat_id), "candidatos")
+
+# /surebets [n=.. p=..]
+async def surebets(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    consulta = await _consulta(update, context)
+    if consulta is not None:
+        await _responder(update, "surebets", "surebets", _paginado(format_surebets, consulta), "surebets")
+
+# /middles [n=.. p=..]
 async def middles(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("🔍 Buscando middles...")
+    consulta = await _consulta(update, context)
+    if consulta is not None:
+        await _responder(update, "middles", "middles", _paginado(format_middles, consulta), "middles")
 
-    async def tarea():
+# /moves
+async def moves(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _enviar(update.message.reply_text, format_moves())
+
+# /subscribe
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if suscribir(update.effective_chat.id):
+        await update.message.reply_text("🔔 Suscrito: recibirás las value bets y surebets nuevas.")
+    else:
+        await update.message.reply_text("🔔 Ya estabas suscrito.")
+
+# /unsubscribe
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if desuscribir(update.effective_chat.id):
+        await update.message.reply_text("🔕 Suscripción cancelada.")
+    else:
+        await update.message.reply_text("🔕 No estabas suscrito.")
+
+# ---- Scan periódico + alertas push ----
+async def _alertar(parcial):
+    """
+    Push a los suscriptores de lo nuevo de cada deporte según termina. Solo
+    se marcan como enviadas si han llegado al menos a un chat (si no, salen
+    en el siguiente scan).
+    """
+    suscriptores = get_suscriptores()
+    if not suscriptores:
+        return
+    values, sbs = picks_nuevos(parcial)
+    if not (values or sbs):
+        return
+    textos = {}  # un render por bank distinto, no por suscriptor
+    entregadas = 0
+    for chat_id in suscriptores:
+        bank = get_bank(chat_id)
+        if bank not in textos:
+            with metricas.cronometro("telegram.formato_ms"):
+                textos[bank] = format_alertas(values, sbs, bank)
         try:
-            apuestas = scan("middles")
-            if not apuestas:
-                await update.message.reply_text("❌ No se encontraron middles.")
-            else:
-                texto = format_middles(apuestas)
-                await update.message.reply_text(texto, parse_mode="Markdown")
+            await _enviar(functools.partial(app.bot.send_message, chat_id), textos[bank])
+            entregadas += 1
+        except Forbidden:
+            desuscribir(chat_id)  # el usuario bloqueó el bot
         except Exception as e:
-            await update.message.reply_text(f"❌ Error en /middles: {e}")
+            logging.warning("⚠️ No se pudo enviar alerta a %s: %s", chat_id, e)
+    if entregadas:
+        marcar_enviados(values, sbs)
 
-    asyncio.create_task(tarea())
+_oyentes.add(_alertar)
+
+async def job_scan(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await _refrescar()
+    except Exception:
+        pass  # ya registrado en _fin_scan; las alertas salen por deporte
+
+# /stats (solo administradores: ADMIN_IDS)
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user is None or update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("⛔️ Comando solo para administradores.")
+        return
+    q = cliente.quota()
+    edad = cache_edad()
+    cab = (f"📊 Cuota API: {q['remaining']} restantes, {q['used']} usados | "
+           f"último scan: {'—' if edad is None else f'hace {int(edad)} s'}\n")
+    # dentro del bloque de código MarkdownV2 solo hay que escapar ` y \
+    cuerpo = metricas.resumen().replace("\\", "\\\\").replace("`", "\\`")
+    await update.message.reply_text(esc_md(cab) + "```\n" + cuerpo + "\n```", parse_mode=PARSE_MODE)
 
-# /bank
+# /bank (uno por chat)
 async def bank(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    bank_actual = get_bank()
+    bank_actual = get_bank(update.effective_chat.id)
     await update.message.reply_text(f"🏦 Bank actual: {bank_actual} unidades.")
 
 # /setbank
 async def setbank_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         cantidad = float(context.args[0])
-        set_bank(cantidad)
+        if not 0 < cantidad < float("inf"):
+            raise ValueError(cantidad)
+        set_bank(cantidad, update.effective_chat.id)
         await update.message.reply_text(f"✅ Bank configurado a {cantidad} unidades.")
     except (IndexError, ValueError):
-        await update.message.reply_text("❌ Uso correcto: /setbank <cantidad>")
+        await update.message.reply_text("❌ Uso correcto: /setbank <cantidad> (mayor que 0)")
 
 # Registrar comandos
 app.add_handler(CommandHandler("start", start))
 app.add_handler(CommandHandler("value", value))
 app.add_handler(CommandHandler("surebets", surebets))
 app.add_handler(CommandHandler("middles", middles))
+app.add_handler(CommandHandler("moves", moves))
+app.add_handler(CommandHandler("stats", stats))
 app.add_handler(CommandHandler("bank", bank))
 app.add_handler(CommandHandler("setbank", setbank_cmd))
+app.add_handler(CommandHandler("subscribe", subscribe))
+app.add_handler(CommandHandler("unsubscribe", unsubscribe))
+
+if app.job_queue:
+    app.job_queue.run_repeating(job_scan, interval=SCAN_INTERVAL_SEC, first=10)
+else:
+    logging.warning("⚠️ JobQueue no disponible: instala python-telegram-bot[job-queue] para el scan periódico.")
 
 # Ejecutar con webhook
 if __name__ == "__main__":
     import nest_asyncio
     nest_asyncio.apply()
 
+    banks.precargar()
+    if arranque_en_caliente():
+        print(f"📥 Último scan cargado del snapshot ({int(cache_edad())} s de antigüedad).")
+
+    if METRICS_PORT:
+        metricas.servir_http(METRICS_PORT, METRICS_HOST)
+        print(f"📊 Métricas en http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
     print("🚀 Iniciando servidor con Webhook...")
     app.run_webhook(
         listen="0.0.0.0",
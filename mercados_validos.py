@@ -1,10 +1,8 @@
 import os
 import json
 import datetime
-import requests
+from api_odds_cliente import cliente, coste_llamada, QuotaAgotada
 
-API_KEY = os.getenv("ODDS_API_KEY")
-BASE_URL = "https://api.the-odds-api.com/v4"
 CACHE_FILE = "mercados_validos_cache.json"
 
 MAX_CACHE_AGE = 86400  # 24h
@@ -23,17 +21,13 @@ def guardar_cache_mercados(data):
         json.dump(data, f, indent=2)
 
 def get_markets_for_sport(sport_key):
-    url = f"{BASE_URL}/sports/{sport_key}/odds/"
     params = {
-        "apiKey": API_KEY,
         "regions": "us,uk,eu,au",
         "markets": "h2h,spreads,totals",  # quitado btts y draw_no_bet
         "oddsFormat": "decimal"
     }
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        eventos = response.json()
+        eventos = cliente.get_json(f"/sports/{sport_key}/odds/", params, coste=coste_llamada(params))
         mercados = set()
 
         for evento in eventos:
@@ -44,6 +38,8 @@ def get_markets_for_sport(sport_key):
                         mercados.add(key)
 
         return list(mercados)
+    except QuotaAgotada:
+        raise
     except Exception as e:
         print(f"⚠️ Error al consultar mercados para {sport_key}: {e}")
         return []
@@ -61,17 +57,19 @@ def obtener_mercados_validos():
             pass
 
     print("🔄 Actualizando caché de mercados válidos...")
-    url_sports = f"{BASE_URL}/sports/?apiKey={API_KEY}"
-    response = requests.get(url_sports)
-    response.raise_for_status()
-    deportes = response.json()
+    deportes = cliente.get_json("/sports/")
 
     mercados_validos = {}
     for deporte in deportes:
         if not deporte.get("active") or deporte.get("has_outrights"):
             continue
         key = deporte["key"]
-        mercados = get_markets_for_sport(key)
+        try:
+            mercados = get_markets_for_sport(key)
+        except QuotaAgotada as e:
+            # sin cuota no se guarda una caché incompleta
+            print(f"⛔️ Sondeo de mercados detenido: {e}")
+            return cache or mercados_validos
         if mercados:
             mercados_validos[key] = mercados
 
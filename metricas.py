@@ -0,0 +1,155 @@
+# metricas.py
+"""
+Métricas ligeras del pipeline, en memoria y seguras entre hilos.
+
+- observar(nombre, valor): añade una muestra a la serie `nombre`, un buffer
+  circular de las últimas METRICAS_VENTANA muestras (más total y suma
+  acumulados). Los percentiles se calculan al pedirlos, no al registrar.
+- contar(nombre, n): contador monotónico.
+- cronometro(nombre) / @medido(nombre): tiempo en ms de un bloque/función.
+- texto(): exposición en texto plano (formato Prometheus) y resumen(): texto
+  legible para /stats.
+- servir_http(puerto, host): endpoint GET /metrics (sin auth; por defecto solo
+  en 127.0.0.1) en un hilo aparte.
+"""
+import os, time, threading, functools
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+VENTANA = int(os.getenv("METRICAS_VENTANA", "512"))
+PERCENTILES = (0.5, 0.9, 0.99)
+
+_lock = threading.Lock()
+_series = {}      # nombre -> [deque(maxlen=VENTANA), total, suma]
+_contadores = {}  # nombre -> int
+_inicio = time.time()
+
+
+def observar(nombre, valor):
+    with _lock:
+        s = _series.get(nombre)
+        if s is None:
+            s = _series[nombre] = [deque(maxlen=VENTANA), 0, 0.0]
+        s[0].append(valor)
+        s[1] += 1
+        s[2] += valor
+
+
+def contar(nombre, n=1):
+    with _lock:
+        _contadores[nombre] = _contadores.get(nombre, 0) + n
+
+
+class cronometro:
+    """with cronometro("scan.total_ms"): ...  (también expone .ms al salir)"""
+    __slots__ = ("nombre", "t0", "ms")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self.t0) * 1000.0
+        observar(self.nombre, self.ms)
+        return False
+
+
+def medido(nombre):
+    """Decorador: observa la duración (ms) de cada llamada en `nombre`."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def envoltura(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observar(nombre, (time.perf_counter() - t0) * 1000.0)
+        return envoltura
+    return deco
+
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    i = p * (len(ordenados) - 1)
+    lo = int(i)
+    hi = min(lo + 1, len(ordenados) - 1)
+    return ordenados[lo] + (ordenados[hi] - ordenados[lo]) * (i - lo)
+
+
+def instantanea():
+    """{"series": {nombre: {n, total, suma, p50, p90, p99, max}}, "contadores": {...}}"""
+    with _lock:
+        series = {k: (sorted(s[0]), s[1], s[2]) for k, s in _series.items()}
+        contadores = dict(_contadores)
+    out = {}
+    for k, (orden, total, suma) in series.items():
+        d = {"n": len(orden), "total": total, "suma": suma, "max": orden[-1] if orden else 0.0}
+        for p in PERCENTILES:
+            d[f"p{int(p * 100)}"] = _percentil(orden, p)
+        out[k] = d
+    return {"series": out, "contadores": contadores, "uptime_s": time.time() - _inicio}
+
+
+def _nombre_prom(nombre):
+    return "betbot_" + "".join(c if c.isalnum() else "_" for c in nombre)
+
+
+def texto():
+    """Exposición en texto plano (compatible con Prometheus: summary + counters)."""
+    snap = instantanea()
+    lineas = [f"betbot_uptime_seconds {snap['uptime_s']:.0f}"]
+    for k, d in sorted(snap["series"].items()):
+        n = _nombre_prom(k)
+        lineas.append(f"# TYPE {n} summary")
+        for p in PERCENTILES:
+            lineas.append(f'{n}{{quantile="{p}"}} {d[f"p{int(p * 100)}"]:.3f}')
+        lineas.append(f"{n}_sum {d['suma']:.3f}")
+        lineas.append(f"{n}_count {d['total']}")
+    for k, v in sorted(snap["contadores"].items()):
+        n = _nombre_prom(k) + "_total"
+        lineas.append(f"# TYPE {n} counter")
+        lineas.append(f"{n} {v}")
+    return "\n".join(lineas) + "\n"
+
+
+def resumen():
+    """Texto compacto para /stats: p50/p90/p99/máx de cada serie y contadores."""
+    snap = instantanea()
+    lineas = [f"uptime {snap['uptime_s'] / 3600:.1f} h | ventana {VENTANA} muestras"]
+    if snap["series"]:
+        ancho = max(len(k) for k in snap["series"])
+        lineas.append(f"{'serie':<{ancho}}  {'n':>6} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+        for k, d in sorted(snap["series"].items()):
+            lineas.append(f"{k:<{ancho}}  {d['total']:>6} {d['p50']:>9.1f} {d['p90']:>9.1f} {d['p99']:>9.1f} {d['max']:>9.1f}")
+    if snap["contadores"]:
+        lineas.append("")
+        lineas += [f"{k}: {v}" for k, v in sorted(snap["contadores"].items())]
+    return "\n".join(lineas)
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        cuerpo = texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def servir_http(puerto, host="127.0.0.1"):
+    """Arranca GET /metrics en un hilo daemon. Devuelve el servidor."""
+    srv = ThreadingHTTPServer((host, puerto), _Manejador)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="metricas-http", daemon=True).start()
+    return srv
@@ -0,0 +1,176 @@
+# motor_valor.py
+"""
+Motor columnar (NumPy) para probabilidades justas, edges y surebets.
+
+Empaqueta todos los grupos de k vías en arrays planos:
+  precios  -> todas las cuotas, grupo a grupo y lado a lado
+  lens     -> nº de cuotas de cada segmento (grupo, lado)
+  starts   -> offset de cada segmento dentro de `precios`
+y calcula en unas pocas operaciones por lotes el consenso sin vig (método
+por tipo de mercado, ver devig.py), la mejor
+cuota (y su casa) por lado, los edges y el margen de arbitraje.
+
+Las filas de entrada son las que generan selector_valor._iter_two_way /
+_iter_three_way: (meta, nombreA, preciosA, nombreB, preciosB[, nombreC, preciosC]).
+"""
+from array import array
+
+import numpy as np
+
+from cuotas_compactas import Lado
+import devig
+
+
+class Paquete:
+    __slots__ = ("k", "metas", "nombres", "casas", "lens", "best", "best_casa", "fair", "n_books")
+
+    def __init__(self, filas, k, metodo_de=None):
+        """
+        metodo_de(mercado) -> método de devig para ese tipo de mercado
+        (ver devig.METODOS); None = "media" en todos los grupos.
+        """
+        self.k = k
+        self.metas = []
+        self.nombres = []
+        self.casas = []
+        precios, lens = array("d"), []
+        # ids de casa por cuota: id dentro de su tabla + offset de la tabla en
+        # `nombres_casa` (una tabla por deporte; las listas (cuota, casa) usan `ids_lista`)
+        ids, offs = array("q"), []
+        offsets, nombres_casa, ids_lista = {}, [], {}
+        for fila in filas:
+            self.metas.append(fila[0])
+            for j in range(k):
+                self.nombres.append(fila[1 + 2 * j])
+                lado = fila[2 + 2 * j]
+                if isinstance(lado, Lado):
+                    # formato compacto: copia directa de los arrays
+                    precios.extend(lado.precios)
+                    self.casas.extend(map(lado.tabla.nombres.__getitem__, lado.casas))
+                    lens.append(len(lado))
+                    off = offsets.get(id(lado.tabla))
+                    if off is None:
+                        off = offsets[id(lado.tabla)] = len(nombres_casa)
+                        nombres_casa.extend(lado.tabla.nombres)
+                    ids.fromlist(lado.casas.tolist())
+                    offs.append(off)
+                else:
+                    ps, cs = zip(*lado)
+                    precios.extend(ps)
+                    self.casas.extend(cs)
+                    lens.append(len(ps))
+                    for c in cs:
+                        i = ids_lista.get(c)
+                        if i is None:
+                            i = ids_lista[c] = len(nombres_casa)
+                            nombres_casa.append(c)
+                        ids.append(i)
+                    offs.append(0)
+
+        G = len(self.metas)
+        P = np.frombuffer(precios, dtype=np.float64) if precios else np.zeros(0)
+        L = np.asarray(lens, dtype=np.int64)
+        starts = np.zeros(G * k, dtype=np.int64)
+        if G:
+            np.cumsum(L[:-1], out=starts[1:])
+
+        # consenso "media": media de probabilidades implícitas por lado, normalizada por grupo
+        media_inv = np.add.reduceat(1.0 / P, starts) / L if G else np.zeros(0)
+        M = media_inv.reshape(G, k)
+        self.fair = M / M.sum(axis=1, keepdims=True)
+
+        metodos = [metodo_de(m.get("mercado", "h2h" if k == 3 else "")) for m in self.metas] if metodo_de and G else []
+        if any(m != "media" for m in metodos):
+            gid = np.frombuffer(ids, dtype=np.int64) + np.repeat(np.asarray(offs, dtype=np.int64), L)
+            self._fair_por_casa(P, L, gid, nombres_casa, metodos)
+
+        # mejor cuota por lado y la primera casa que la ofrece (como max() en Python)
+        best = np.maximum.reduceat(P, starts) if G else np.zeros(0)
+        seg = np.repeat(np.arange(G * k), L)
+        cand = np.flatnonzero(P == best[seg])
+        self.best_casa = cand[np.searchsorted(seg[cand], np.arange(G * k))]
+        self.best = best.reshape(G, k)
+        self.lens = L.reshape(G, k)
+        self.n_books = self.lens.min(axis=1) if G else np.zeros(0, dtype=np.int64)
+
+    def _fair_por_casa(self, P, L, gid, nombres_casa, metodos):
+        """
+        Devig casa a casa: una fila por (grupo, casa) con todos los lados
+        cotizados (si una casa repite lado, cuenta su primera cuota), método
+        del grupo y consenso ponderado por casa. Los grupos sin ninguna fila
+        completa se quedan con "media".
+        """
+        k, G, NC = self.k, len(self.metas), max(1, len(nombres_casa))
+        seg = np.repeat(np.arange(G * k), L)
+        grupo, lado = seg // k, seg % k
+        clave = grupo * NC + gid
+        o = np.lexsort((lado, clave))  # estable: ante duplicados queda la primera cuota
+        cl, la = clave[o], lado[o]
+        nuevo = np.ones(len(o), dtype=bool)
+        nuevo[1:] = (cl[1:] != cl[:-1]) | (la[1:] != la[:-1])
+        o, cl, la = o[nuevo], cl[nuevo], la[nuevo]
+        claves, cuenta = np.unique(cl, return_counts=True)
+        completas = cuenta == k
+        if not completas.any():
+            return
+        sel = np.repeat(completas, cuenta)
+        R = int(completas.sum())
+        Pi = np.empty((R, k))
+        Pi[np.repeat(np.arange(R), k), la[sel]] = 1.0 / P[o[sel]]
+        claves = claves[completas]
+        grupo_fila = claves // NC
+        w = np.array([devig.peso(n) for n in nombres_casa])[claves % NC] if nombres_casa else np.ones(R)
+
+        metodos = np.asarray(metodos)
+        for m in set(metodos.tolist()) - {"media"}:
+            filas_m = (metodos == m)[grupo_fila]
+            if not filas_m.any():
+                continue
+            F = devig.consenso(devig.quitar_margen(Pi[filas_m], m), grupo_fila[filas_m], w[filas_m], G)
+            ok = (metodos == m) & ~np.isnan(F[:, 0])
+            self.fair[ok] = F[ok]
+
+
+def _validar(filas, k):
+    # reduceat no admite segmentos vacíos: todos los lados deben traer cuotas
+    return [f for f in filas if all(f[2 + 2 * j] for j in range(k))]
+
+
+def candidatos(filas, k, min_books=3, edge_min=0.02, metodo_de=None):
+    """Picks con edge >= edge_min, mismo formato y orden que selector_valor."""
+    pq = Paquete(_validar(filas, k), k, metodo_de)
+    if not pq.metas:
+        return []
+    edges = pq.best * pq.fair - 1.0
+    mask = (pq.n_books >= min_books)[:, None] & (edges >= edge_min)
+
+    picks = []
+    for g, j in zip(*np.nonzero(mask)):
+        i = g * k + j
+        picks.append({
+            "meta": pq.metas[g], "nombre": pq.nombres[i], "cuota": round(float(pq.best[g, j]), 3),
+            "casa": pq.casas[pq.best_casa[i]], "p_fair": round(float(pq.fair[g, j]), 4),
+            "edge": round(float(edges[g, j]), 4), "books": int(pq.n_books[g]),
+        })
+    picks.sort(key=lambda x: (x["edge"], x["p_fair"]), reverse=True)
+    return picks
+
+
+def surebets(filas, k):
+    """Grupos donde sum(1/mejor_cuota) < 1, ordenados por margen."""
+    pq = Paquete(_validar(filas, k), k)
+    if not pq.metas:
+        return []
+    inv_sum = (1.0 / pq.best).sum(axis=1)
+
+    sbs = []
+    for g in np.flatnonzero(inv_sum < 1.0):
+        meta = pq.metas[g]
+        precios = {pq.nombres[g * k + j]: round(float(pq.best[g, j]), 3) for j in range(k)}
+        sb = {"meta": meta, "mercado": meta.get("mercado") if k == 2 else "h2h"}
+        if k == 2:
+            sb["linea"] = meta.get("linea")
+        sb.update(precios=precios, arb_margin=round(1.0 - float(inv_sum[g]), 4))
+        sbs.append(sb)
+    sbs.sort(key=lambda x: x["arb_margin"], reverse=True)
+    return sbs
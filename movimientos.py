@@ -0,0 +1,152 @@
+# movimientos.py
+"""
+Movimientos de línea entre scans consecutivos.
+
+Se alimenta con las mismas filas normalizadas que el histórico:
+  (event_id, mercado, linea, outcome, casa, cuota)
+cuya clave (event_id, mercado, linea) es la de los grupos de api_odds_ext /
+api_odds.scan_and_group, más outcome y casa.
+
+- Diff: un dict con el último precio por (evento, mercado, línea, outcome,
+  casa); cada fila es una consulta O(1) y solo los cambios generan trabajo.
+- Steam: >= STEAM_MIN_CASAS casas distintas acortando la misma selección
+  dentro de STEAM_VENTANA_SEG.
+- Casas rezagadas: en selecciones que se han movido, casas que siguen
+  pagando por encima del consenso actual en más de STALE_MARGEN (no han
+  seguido el movimiento) -> señales de valor. Caducan a los
+  STALE_VENTANA_SEG si la selección no se vuelve a mover.
+Steam, rezagadas y movimientos de eventos ya empezados se olvidan con el
+resto del estado del evento.
+El análisis de steam/rezagadas solo recorre las selecciones que cambiaron.
+"""
+import os, threading, time, datetime, heapq
+from collections import deque
+
+STEAM_MIN_CASAS = int(os.getenv("STEAM_MIN_CASAS", "3"))
+STEAM_VENTANA_SEG = int(os.getenv("STEAM_VENTANA_SEG", "1800"))
+STALE_MARGEN = float(os.getenv("STALE_MARGEN", "0.03"))  # 3% sobre el consenso
+STALE_VENTANA_SEG = int(os.getenv("STALE_VENTANA_SEG", "1800"))  # vida de una rezagada sin volver a verse
+MOVES_MAX = int(os.getenv("MOVES_MAX", "500"))          # movimientos recientes guardados
+
+_lock = threading.Lock()
+_ultimo = {}      # (ev, mk, linea, outcome, casa) -> cuota
+_seleccion = {}   # (ev, mk, linea, outcome) -> {casa: cuota}
+_recortes = {}    # (ev, mk, linea, outcome) -> deque[(ts, casa)] acortamientos recientes
+_metas = {}       # event_id -> meta del evento (deporte, evento, hora, ...)
+_por_evento = {}  # event_id -> {(ev, mk, linea, outcome)}: para podar solo lo del evento
+_estado = {"ts": 0.0, "moves": deque(maxlen=MOVES_MAX), "steam": [], "rezagadas": []}
+
+
+def registrar(filas, ts=None, metas=None):
+    """
+    Compara las filas del scan con el anterior y actualiza steam/rezagadas.
+    Devuelve el nº de cotizaciones que cambiaron.
+    """
+    ts = time.time() if ts is None else ts
+    with _lock:
+        if metas:
+            _metas.update(metas)
+        tocadas = set()
+        cambios = 0
+        for ev, mk, linea, outcome, casa, cuota in filas:
+            k = (ev, mk, linea, outcome, casa)
+            prev = _ultimo.get(k)
+            if prev == cuota:
+                continue
+            _ultimo[k] = cuota
+            sel = k[:4]
+            precios = _seleccion.get(sel)
+            if precios is None:
+                precios = _seleccion[sel] = {}
+                _por_evento.setdefault(ev, set()).add(sel)
+            precios[casa] = cuota
+            if prev is None:
+                continue  # cotización nueva, no es un movimiento
+            cambios += 1
+            tocadas.add(sel)
+            _estado["moves"].append({"ts": ts, "sel": sel, "casa": casa, "antes": prev, "ahora": cuota,
+                                     "cambio": round(cuota / prev - 1.0, 4)})
+            if cuota < prev:
+                _recortes.setdefault(sel, deque()).append((ts, casa))
+
+        # las que no se han vuelto a mover se mantienen hasta su ventana
+        _estado["steam"] = _detectar_steam(tocadas, ts) + [
+            s for s in _estado["steam"] if s["sel"] not in tocadas and ts - s["ts"] <= STEAM_VENTANA_SEG]
+        _estado["rezagadas"] = _detectar_rezagadas(tocadas, ts) + [
+            r for r in _estado["rezagadas"] if r["sel"] not in tocadas and ts - r["ts"] <= STALE_VENTANA_SEG]
+        _estado["ts"] = ts
+        _podar(ts)
+        return cambios
+
+
+def _detectar_steam(tocadas, ts):
+    steam = []
+    for sel in tocadas:
+        dq = _recortes.get(sel)
+        if not dq:
+            continue
+        while dq and ts - dq[0][0] > STEAM_VENTANA_SEG:
+            dq.popleft()
+        casas = {c for _, c in dq}
+        if len(casas) >= STEAM_MIN_CASAS:
+            steam.append({"ts": ts, "sel": sel, "casas": sorted(casas), "n_casas": len(casas)})
+    steam.sort(key=lambda s: s["n_casas"], reverse=True)
+    return steam
+
+
+def _detectar_rezagadas(tocadas, ts):
+    rez = []
+    for sel in tocadas:
+        precios = _seleccion.get(sel, {})
+        if len(precios) < 2:
+            continue
+        # consenso en probabilidad implícita, sin la propia casa
+        inv_total = sum(1.0 / p for p in precios.values())
+        n = len(precios)
+        for casa, p in precios.items():
+            consenso = (n - 1) / (inv_total - 1.0 / p)
+            exceso = p / consenso - 1.0
+            if exceso >= STALE_MARGEN:
+                rez.append({"ts": ts, "sel": sel, "casa": casa, "cuota": p,
+                            "consenso": round(consenso, 3), "exceso": round(exceso, 4)})
+    rez.sort(key=lambda r: r["exceso"], reverse=True)
+    return rez
+
+
+def _podar(ts):
+    """
+    Olvida eventos ya empezados. Recorre metas y, de los eventos empezados,
+    solo sus selecciones (índice _por_evento), no todo el libro.
+    """
+    ahora = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+    pasados = {ev for ev, m in _metas.items() if (m.get("hora") or "9") < ahora}
+    if not pasados:
+        return
+    for ev in pasados:
+        for sel in _por_evento.pop(ev, ()):
+            for casa in _seleccion.pop(sel, ()):
+                _ultimo.pop(sel + (casa,), None)
+            _recortes.pop(sel, None)
+    for lista in ("steam", "rezagadas"):
+        _estado[lista] = [x for x in _estado[lista] if x["sel"][0] not in pasados]
+    _estado["moves"] = deque((m for m in _estado["moves"] if m["sel"][0] not in pasados), maxlen=MOVES_MAX)
+    for ev in pasados:
+        del _metas[ev]
+
+
+def meta(event_id):
+    return _metas.get(event_id, {})
+
+
+def resumen(n=5):
+    """Top de steam, casas rezagadas y mayores movimientos del último scan."""
+    with _lock:
+        moves = [m for m in _estado["moves"] if m["ts"] == _estado["ts"]]
+        moves.sort(key=lambda m: abs(m["cambio"]), reverse=True)
+        # cada registrar (uno por deporte) antepone lo suyo: el top se saca del total
+        return {
+            "ts": _estado["ts"],
+            "steam": heapq.nlargest(n, _estado["steam"], key=lambda s: s["n_casas"]),
+            "rezagadas": heapq.nlargest(n, _estado["rezagadas"], key=lambda r: r["exceso"]),
+            "moves": moves[:n],
+        }
@@ -0,0 +1,145 @@
+# normalizacion.py
+"""
+Lado canónico de cada outcome de /odds.
+
+Cada evento trae home_team/away_team; con ellos se construye un índice por
+evento (IndiceEvento) que resuelve el nombre de un outcome a su lado:
+  h2h                                   -> 0 local, 1 visitante, 2 empate
+  spreads, alternate_spreads, DNB       -> 0 local, 1 visitante
+  totals, alternate_totals              -> 0 Over, 1 Under
+  btts                                  -> 0 Yes, 1 No
+con la etiqueta canónica (el nombre del equipo tal como viene en el
+evento, "Over", "Yes"...). Así el mismo equipo cae siempre en el mismo lado,
+llegue en el orden que llegue.
+- Nombres: clave() los pasa a minúsculas sin tildes ni puntuación, y el
+  índice de alias (ALIAS_EQUIPOS, JSON {"Canónico": ["alias", ...]}) se
+  precalcula en un dict clave -> clave canónica.
+- Caché: cada IndiceEvento memoriza (tipo, nombre) -> (lado, etiqueta), así
+  que en el bucle de agrupación cada outcome es un solo .get(); la
+  resolución con claves y alias solo corre la primera vez que se ve un
+  nombre. Los índices se guardan por event_id entre scans (se rehacen si
+  cambian los equipos).
+Los outcomes que no encajan en ningún lado devuelven SIN_LADO.
+"""
+import json, os, re, threading, unicodedata
+
+ALIAS_FILE = os.getenv("ALIAS_EQUIPOS", "alias_equipos.json")
+MAX_EVENTOS = int(os.getenv("NORMALIZACION_MAX_EVENTOS", "20000"))  # índices guardados entre scans
+
+LOCAL, VISITANTE, EMPATE = 0, 1, 2
+SIN_LADO = (None, None)
+
+# tipo de outcome por mercado (los que no están se tratan como de equipos)
+TIPOS = {
+    "h2h": "h2h",
+    "spreads": "equipos", "alternate_spreads": "equipos", "draw_no_bet": "equipos",
+    "totals": "totals", "alternate_totals": "totals",
+    "btts": "btts",
+}
+SPREADS = ("spreads", "alternate_spreads")
+_FIJOS = {
+    "totals": {"over": (0, "Over"), "o": (0, "Over"), "mas": (0, "Over"),
+               "under": (1, "Under"), "u": (1, "Under"), "menos": (1, "Under")},
+    "btts": {"yes": (0, "Yes"), "si": (0, "Yes"), "no": (1, "No")},
+}
+_EMPATES = {"draw", "empate", "tie", "x"}
+_RUIDO = {"fc", "cf", "afc", "sc", "ac", "cd", "club", "the"}  # sufijos/prefijos que no distinguen equipos
+_NO_ALFANUM = re.compile(r"[^0-9a-z]+")
+
+
+def clave(nombre):
+    """Forma comparable de un nombre: minúsculas, sin tildes, puntuación ni sufijos tipo FC."""
+    s = unicodedata.normalize("NFKD", str(nombre)).encode("ascii", "ignore").decode().lower()
+    tokens = _NO_ALFANUM.sub(" ", s).split()
+    utiles = [t for t in tokens if t not in _RUIDO]
+    return " ".join(utiles or tokens)
+
+
+def _cargar_alias():
+    try:
+        with open(ALIAS_FILE, encoding="utf-8") as f:
+            datos = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ No se pudieron cargar los alias de {ALIAS_FILE}: {e}")
+        return {}
+    idx = {}
+    for canonico, alias in datos.items():
+        k = clave(canonico)
+        for a in [canonico, *alias]:
+            idx[clave(a)] = k
+    return idx
+
+
+_alias = _cargar_alias()  # clave de alias -> clave canónica
+
+
+def clave_equipo(nombre):
+    k = clave(nombre)
+    return _alias.get(k, k)
+
+
+def _contenido(tokens, k):
+    otros = set(k.split())
+    return tokens <= otros or otros <= tokens
+
+
+class IndiceEvento:
+    """(tipo, nombre de outcome) -> (lado, etiqueta) de un evento, memorizado."""
+    __slots__ = ("home", "away", "k_home", "k_away", "cache")
+
+    def __init__(self, home, away):
+        self.home = home
+        self.away = away
+        self.k_home = clave_equipo(home) if home else None
+        self.k_away = clave_equipo(away) if away else None
+        self.cache = {}
+
+    def lado(self, tipo, nombre):
+        r = self.cache.get((tipo, nombre))
+        if r is None:
+            r = self.cache[(tipo, nombre)] = self._resolver(tipo, nombre)
+        return r
+
+    def _resolver(self, tipo, nombre):
+        fijos = _FIJOS.get(tipo)
+        if fijos is not None:
+            return fijos.get(clave(nombre), SIN_LADO)
+        k = clave_equipo(nombre)
+        if tipo == "h2h" and k in _EMPATES:
+            return EMPATE, "Draw"
+        if k == self.k_home:
+            return LOCAL, self.home
+        if k == self.k_away:
+            return VISITANTE, self.away
+        # sin alias: las palabras de uno contenidas en las del otro ("Inter" / "Inter Milan")
+        t = set(k.split())
+        en_home = bool(t and self.k_home) and _contenido(t, self.k_home)
+        en_away = bool(t and self.k_away) and _contenido(t, self.k_away)
+        if en_home != en_away:
+            return (LOCAL, self.home) if en_home else (VISITANTE, self.away)
+        return SIN_LADO
+
+
+_indices = {}  # event_id -> IndiceEvento, compartidos entre scans
+_lock = threading.Lock()
+
+
+def indice_evento(event_id, home, away):
+    """Índice del evento, reutilizando el de scans anteriores si los equipos no han cambiado."""
+    idx = _indices.get(event_id)
+    if idx is None or idx.home != home or idx.away != away:
+        idx = IndiceEvento(home, away)
+        with _lock:
+            if len(_indices) >= MAX_EVENTOS:
+                _indices.clear()  # eventos viejos: se rehacen bajo demanda
+            _indices[event_id] = idx
+    return idx
+
+
+def linea_seleccion(mercado, linea, nombre, home):
+    """Línea propia de la selección: los grupos de spreads van por la línea del local."""
+    if linea is None or mercado not in SPREADS or nombre == home:
+        return linea
+    return -linea or 0.0
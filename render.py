@@ -0,0 +1,97 @@
+# render.py
+"""
+Capa de salida para Telegram (MarkdownV2).
+
+- partir(texto): trocea un mensaje largo en partes de <= LIMITE (UTF-16),
+  cortando entre bloques (línea en blanco), si no entre líneas y solo en
+  último caso a mitad de línea (sin dejar un escape "\\" colgando).
+- CacheRender: textos ya renderizados por clave, p.ej. (tipo, versión del
+  scan, bank, página); un /value repetido con el mismo scan no re-renderiza.
+  LRU acotado a RENDER_CACHE entradas.
+"""
+import os, threading
+from collections import OrderedDict
+
+import metricas
+
+LIMITE = 4096  # máximo de un mensaje de Telegram, en unidades UTF-16 (un emoji cuenta 2)
+PARSE_MODE = "MarkdownV2"
+
+
+def _largo(texto):
+    return len(texto.encode("utf-16-le")) // 2
+
+
+def _cortar(texto, limite, sep):
+    """Parte `texto` por `sep` agrupando trozos mientras quepan; los que no caben salen solos."""
+    partes, actual = [], ""
+    for trozo in texto.split(sep):
+        candidato = f"{actual}{sep}{trozo}" if actual else trozo
+        if _largo(candidato) <= limite:
+            actual = candidato
+            continue
+        if actual:
+            partes.append(actual)
+        actual = trozo
+    if actual:
+        partes.append(actual)
+    return partes
+
+
+def _cortar_duro(texto, limite):
+    partes = []
+    while _largo(texto) > limite:
+        corte = limite // 2  # en el peor caso todo son pares sustitutos
+        while corte < len(texto) and _largo(texto[:corte + 1]) <= limite:
+            corte += 1
+        # no separar "\x" de su carácter: retrocede si el corte deja una barra impar al final
+        barras = corte - len(texto[:corte].rstrip("\\"))
+        if barras % 2:
+            corte -= 1
+        partes.append(texto[:corte])
+        texto = texto[corte:]
+    if texto:
+        partes.append(texto)
+    return partes
+
+
+def partir(texto, limite=LIMITE):
+    """Lista de mensajes de <= limite (UTF-16) que juntos forman `texto`."""
+    if _largo(texto) <= limite:
+        return [texto]
+    out = []
+    for bloque in _cortar(texto, limite, "\n\n"):
+        if _largo(bloque) <= limite:
+            out.append(bloque)
+            continue
+        for linea in _cortar(bloque, limite, "\n"):
+            out.extend(_cortar_duro(linea, limite) if _largo(linea) > limite else [linea])
+    return out
+
+
+class CacheRender:
+    """LRU clave -> texto renderizado, seguro entre hilos."""
+
+    def __init__(self, maximo=None):
+        self.maximo = maximo or int(os.getenv("RENDER_CACHE", "128"))
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, render):
+        """El texto de `clave`, llamando a render() solo si no está."""
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                texto = self._datos[clave]
+            else:
+                texto = None
+        if texto is not None:
+            metricas.contar("render.cache_aciertos")
+            return texto
+        metricas.contar("render.cache_fallos")
+        texto = render()
+        with self._lock:
+            self._datos[clave] = texto
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+        return texto
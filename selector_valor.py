@@ -6,16 +6,62 @@ from utils_valor import (
     value_edge,
 )
 
+import os
+from bisect import bisect_left
+from itertools import accumulate
+
+from cuotas_compactas import Grupo
+from normalizacion import linea_seleccion
+from metricas import medido
+
+try:
+    import motor_valor  # motor vectorizado (NumPy)
+    import arbitraje    # arbitraje entre mercados (NumPy)
+    import devig        # métodos de devig (NumPy)
+except ImportError:
+    motor_valor = arbitraje = devig = None
+
+
+# --------- Devig por tipo de mercado ---------
+def _leer_metodos(txt):
+    """'h2h:shin,*:potencia' -> {"h2h": "shin", "*": "potencia"} (devig.METODOS)."""
+    if devig is None:
+        return {}  # sin NumPy no hay métodos que elegir
+    validos = devig.METODOS
+    metodos = {}
+    for par in filter(None, (p.strip() for p in txt.split(","))):
+        mercado, _, metodo = par.partition(":")
+        metodo = metodo.strip()
+        if metodo not in validos:
+            print(f"⚠️ DEVIG_METODOS: método desconocido {metodo!r} para {mercado!r}, uso 'media'")
+            metodo = "media"
+        metodos[mercado.strip()] = metodo
+    return metodos
+
+# Solo con NumPy: sin motor_valor todos los mercados usan "media" (fair_probs_*)
+METODOS_DEVIG = _leer_metodos(os.getenv("DEVIG_METODOS", "h2h:shin,draw_no_bet:shin,*:potencia"))
+
+
+def metodo_devig(mercado):
+    return METODOS_DEVIG.get(mercado) or METODOS_DEVIG.get("*", "media")
+
 # --------- Helpers de entrada ---------
 def _iter_two_way(groups):
     """
-    Itera grupos de 2 vías en dos formatos posibles:
-      1) dict key -> {"A":[(odds, casa)...], "B":[...], "meta":{...}, "names":{A:...,B:...}}
-      2) list de grupos -> {"meta":{...}, "outcomes": {name:[(odds,casa)...], name2:[...]}}
+    Itera grupos de 2 vías en los formatos posibles:
+      1) dict key -> cuotas_compactas.Grupo (api_odds_ext); los lados se
+         entregan tal cual (iterables de (odds, casa) con arrays debajo)
+      2) dict key -> {"A":[(odds, casa)...], "B":[...], "meta":{...}, "names":{A:...,B:...}}
+      3) list de grupos -> {"meta":{...}, "outcomes": {name:[(odds,casa)...], name2:[...]}}
     Genera tuplas: (meta, nombreA, preciosA, nombreB, preciosB)
     """
     if isinstance(groups, dict):
         for _, g in groups.items():
+            if isinstance(g, Grupo):
+                A, B = g.lados
+                if A and B:
+                    yield g.meta, g.nombre(0), A, g.nombre(1), B
+                continue
             A = g.get("A", [])
             B = g.get("B", [])
             if not A or not B:
@@ -34,6 +80,20 @@ def _iter_two_way(groups):
             yield g["meta"], nameA, pricesA, nameB, pricesB
 
 
+def _iter_two_way_sides(groups_2way):
+    """Como _iter_two_way pero sin exigir ambos lados (una línea alternativa suelta sirve)."""
+    if isinstance(groups_2way, dict):
+        for g in groups_2way.values():
+            if isinstance(g, Grupo):
+                A, B = g.lados
+                yield g.meta, g.nombre(0), A, g.nombre(1), B
+                continue
+            names = g.get("names", {})
+            yield g["meta"], names.get("A", "A"), g.get("A", []), names.get("B", "B"), g.get("B", [])
+    else:
+        yield from _iter_two_way(groups_2way)
+
+
 def _iter_three_way(groups):
     """
     Igual que _iter_two_way pero para 3 vías (1X2).
@@ -41,6 +101,11 @@ def _iter_three_way(groups):
     """
     if isinstance(groups, dict):
         for _, g in groups.items():
+            if isinstance(g, Grupo):
+                A, B, C = g.lados
+                if A and B and C:
+                    yield g.meta, g.nombre(0), A, g.nombre(1), B, g.nombre(2), C
+                continue
             A = g.get("A", [])
             B = g.get("B", [])
             C = g.get("C", [])
@@ -62,14 +127,20 @@ def _iter_three_way(groups):
 
 
 # --------- Value bets ---------
-def build_two_way_candidates(groups_2way, min_books=3, edge_min=0.02):
+@medido("selector.build_two_way_candidates")
+def build_two_way_candidates(groups_2way, min_books=3, edge_min=0.02, metodos=metodo_devig):
     """
     Devuelve lista ordenada de picks con valor para mercados 2 vías.
-    Cada item: {meta, nombre, cuota, casa, p_fair, edge}
+    Cada item: {meta, nombre, cuota, casa, p_fair, edge, books}
+    (books = nº de casas del lado con menos cuotas)
+    metodos(mercado) -> método de devig (None = "media" en todo).
     """
+    if motor_valor is not None:
+        return motor_valor.candidatos(_iter_two_way(groups_2way), 2, min_books, edge_min, metodos)
     picks = []
     for meta, nameA, A, nameB, B in _iter_two_way(groups_2way):
-        if min(len(A), len(B)) < min_books:
+        n = min(len(A), len(B))
+        if n < min_books:
             continue
         pricesA = [p for p, _ in A]
         pricesB = [p for p, _ in B]
@@ -83,24 +154,28 @@ def build_two_way_candidates(groups_2way, min_books=3, edge_min=0.02):
         if eA >= edge_min:
             picks.append({
                 "meta": meta, "nombre": nameA, "cuota": round(bestA[0], 3),
-                "casa": bestA[1], "p_fair": round(pA, 4), "edge": round(eA, 4)
+                "casa": bestA[1], "p_fair": round(pA, 4), "edge": round(eA, 4), "books": n
             })
         if eB >= edge_min:
             picks.append({
                 "meta": meta, "nombre": nameB, "cuota": round(bestB[0], 3),
-                "casa": bestB[1], "p_fair": round(pB, 4), "edge": round(eB, 4)
+                "casa": bestB[1], "p_fair": round(pB, 4), "edge": round(eB, 4), "books": n
             })
     picks.sort(key=lambda x: (x["edge"], x["p_fair"]), reverse=True)
     return picks
 
 
-def build_three_way_candidates(groups_3way, min_books=3, edge_min=0.02):
+@medido("selector.build_three_way_candidates")
+def build_three_way_candidates(groups_3way, min_books=3, edge_min=0.02, metodos=metodo_devig):
     """
     Devuelve lista ordenada de picks con valor para 3 vías (1X2).
     """
+    if motor_valor is not None:
+        return motor_valor.candidatos(_iter_three_way(groups_3way), 3, min_books, edge_min, metodos)
     picks = []
     for meta, nameA, A, nameB, B, nameC, C in _iter_three_way(groups_3way):
-        if min(len(A), len(B), len(C)) < min_books:
+        n = min(len(A), len(B), len(C))
+        if n < min_books:
             continue
         pricesA = [p for p, _ in A]
         pricesB = [p for p, _ in B]
@@ -114,23 +189,26 @@ def build_three_way_candidates(groups_3way, min_books=3, edge_min=0.02):
 
         if eA >= edge_min:
             picks.append({"meta": meta, "nombre": nameA, "cuota": round(bestA[0],3),
-                          "casa": bestA[1], "p_fair": round(pA,4), "edge": round(eA,4)})
+                          "casa": bestA[1], "p_fair": round(pA,4), "edge": round(eA,4), "books": n})
         if eB >= edge_min:
             picks.append({"meta": meta, "nombre": nameB, "cuota": round(bestB[0],3),
-                          "casa": bestB[1], "p_fair": round(pB,4), "edge": round(eB,4)})
+                          "casa": bestB[1], "p_fair": round(pB,4), "edge": round(eB,4), "books": n})
         if eC >= edge_min:
             picks.append({"meta": meta, "nombre": nameC, "cuota": round(bestC[0],3),
-                          "casa": bestC[1], "p_fair": round(pC,4), "edge": round(eC,4)})
+                          "casa": bestC[1], "p_fair": round(pC,4), "edge": round(eC,4), "books": n})
     picks.sort(key=lambda x: (x["edge"], x["p_fair"]), reverse=True)
     return picks
 
 
 # --------- Surebets (arbitraje) ---------
+@medido("selector.detect_surebets_two_way")
 def detect_surebets_two_way(groups_2way):
     """
     Busca arbitrajes en 2 vías: 1/oddsA + 1/oddsB < 1.
     Devuelve lista ordenada por margen descendente.
     """
+    if motor_valor is not None:
+        return motor_valor.surebets(_iter_two_way(groups_2way), 2)
     sbs = []
     for meta, nameA, A, nameB, B in _iter_two_way(groups_2way):
         if not A or not B:
@@ -150,10 +228,13 @@ def detect_surebets_two_way(groups_2way):
     return sbs
 
 
+@medido("selector.detect_surebets_three_way")
 def detect_surebets_three_way(groups_3way):
     """
     Arbitraje 3 vías (1X2): sum(1/odds_i) < 1.
     """
+    if motor_valor is not None:
+        return motor_valor.surebets(_iter_three_way(groups_3way), 3)
     sbs = []
     for meta, nameA, A, nameB, B, nameC, C in _iter_three_way(groups_3way):
         if not A or not B or not C:
@@ -170,4 +251,118 @@ def detect_surebets_three_way(groups_3way):
                 "arb_margin": round(1.0 - inv_sum, 4),
             })
     sbs.sort(key=lambda x: x["arb_margin"], reverse=True)
-    return sbs
\ No newline at end of file
+    return sbs
+
+def _iter_lados(groups_2way, groups_3way):
+    """(meta, mercado, linea, [(nombre, precios), ...]) de todos los grupos, sin exigir lados completos."""
+    for meta, nameA, A, nameB, B in _iter_two_way_sides(groups_2way):
+        yield meta, meta.get("mercado"), meta.get("linea"), [(nameA, A), (nameB, B)]
+    if isinstance(groups_3way, dict):
+        for g in groups_3way.values():
+            if isinstance(g, Grupo):
+                yield g.meta, "h2h", None, [(g.nombre(i), lado) for i, lado in enumerate(g.lados)]
+                continue
+            names = g.get("names", {})
+            yield g["meta"], "h2h", None, [(names.get(k, k), g.get(k, [])) for k in ("A", "B", "C")]
+    else:
+        for g in groups_3way:
+            yield g["meta"], "h2h", None, list(g.get("outcomes", {}).items())
+
+
+@medido("selector.detect_surebets_cruzados")
+def detect_surebets_cruzados(groups_2way, groups_3way):
+    """
+    Arbitrajes entre mercados del mismo evento (h2h + draw_no_bet, spreads 0
+    vs DNB, totals vs alternate_totals...), con el reparto de stakes que
+    asegura beneficio. Ver arbitraje.py. Sin NumPy no se buscan.
+    """
+    if arbitraje is None:
+        return []
+    return arbitraje.buscar(_iter_lados(groups_2way, groups_3way))
+
+# --------- Middles ---------
+# Mercados que se pueden "pillar por el medio" y su familia común
+_FAMILIA_MIDDLE = {
+    "totals": "totals", "alternate_totals": "totals",
+    "spreads": "spreads", "alternate_spreads": "spreads",
+}
+
+
+@medido("selector.indice_lineas")
+def indice_lineas(groups_2way):
+    """
+    Índice por evento de todas las líneas de totals/spreads (incl. alternate_*).
+    Cada línea se expresa como umbral sobre una misma variable X del partido:
+      totals : X = total;  Over L  -> "bajo" L (gana si X > L), Under U -> "alto" U (gana si X < U)
+      spreads: X = margen local;  grupo de línea local h: local -> "bajo" -h, visitante (+q = -h) -> "alto" -h
+    Devuelve {(event_id, familia): {"meta":..., "bajo": {L: (cuota, casa, nombre)}, "alto": {...}}}
+    con la mejor cuota por umbral.
+    """
+    idx = {}
+    for meta, nameA, A, nameB, B in _iter_two_way_sides(groups_2way):
+        fam = _FAMILIA_MIDDLE.get(meta.get("mercado"))
+        linea = meta.get("linea")
+        if fam is None or linea is None:
+            continue
+        linea = float(linea)
+        ent = idx.get((meta["event_id"], fam))
+        if ent is None:
+            ent = idx[(meta["event_id"], fam)] = {"meta": meta, "bajo": {}, "alto": {}}
+        for nombre, precios in ((nameA, A), (nameB, B)):
+            if not precios:
+                continue
+            if fam == "totals":
+                lado, umbral = ("bajo", linea) if nombre == "Over" else ("alto", linea)
+                etiqueta = f"{nombre} {linea:g}"
+            else:
+                lado, umbral = ("bajo", -linea) if nombre == meta.get("home") else ("alto", -linea)
+                etiqueta = f"{nombre} {linea_seleccion(meta.get('mercado'), linea, nombre, meta.get('home')):+g}"
+            cuota, casa = max(precios, key=lambda x: x[0])
+            prev = ent[lado].get(umbral)
+            if prev is None or cuota > prev[0]:
+                ent[lado][umbral] = (cuota, casa, etiqueta)
+    return idx
+
+
+@medido("selector.detect_middles")
+def detect_middles(groups_2way, coste_max=1.06):
+    """
+    Middles: "bajo" L + "alto" U con L < U ganan ambas si L < X < U.
+    coste = 1/cuota_bajo + 1/cuota_alto. Para cada U se busca el middle más
+    ancho que cabe en coste_max: el menor L < U con cuota_bajo >=
+    1 / (coste_max - 1/cuota_alto). Con el máximo acumulado de las cuotas
+    "bajo" (ordenadas por umbral) es una bisección: O(n log n) por evento
+    en vez de todos los pares.
+    Ordena por ancho (U - L) descendente y coste ascendente.
+    """
+    mids = []
+    for (event_id, fam), ent in indice_lineas(groups_2way).items():
+        bajos = sorted(ent["bajo"].items())
+        if not bajos:
+            continue
+        umbrales = [L for L, _ in bajos]
+        max_cuota = list(accumulate((b[0] for _, b in bajos), max))  # no decreciente
+        for U, alto in sorted(ent["alto"].items()):
+            menores = bisect_left(umbrales, U)  # bajos con L < U
+            resto = coste_max - 1.0 / alto[0]
+            if not menores or resto <= 0:
+                continue
+            # primer bajo cuya cuota basta: el de menor L, o sea el middle más ancho
+            j = bisect_left(max_cuota, 1.0 / resto, hi=menores)
+            if j == menores:
+                continue
+            L, bajo = bajos[j]
+            coste = 1.0 / bajo[0] + 1.0 / alto[0]
+            if coste > coste_max + 1e-12:
+                continue
+            meta = ent["meta"]
+            mids.append({
+                "meta": meta,
+                "mercado": fam,
+                "bajo": {"nombre": bajo[2], "cuota": round(bajo[0], 3), "casa": bajo[1]},
+                "alto": {"nombre": alto[2], "cuota": round(alto[0], 3), "casa": alto[1]},
+                "ancho": round(U - L, 2),
+                "coste": round(coste, 4),
+            })
+    mids.sort(key=lambda x: (-x["ancho"], x["coste"]))
+    return mids
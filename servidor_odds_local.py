@@ -0,0 +1,282 @@
+# servidor_odds_local.py
+"""
+Sustituto local de The Odds API v4 para pruebas de carga sin red ni créditos.
+
+Implementa GET /v4/sports y GET /v4/sports/{sport}/odds con los mismos
+parámetros (apiKey, regions, markets, oddsFormat, commenceTimeFrom/To) y
+cabeceras de cuota (x-requests-remaining / -used / -last; coste = nº
+mercados × nº regiones, /sports es gratis). Dos modos:
+  - sintetico: respuestas generadas con simulacion.SimuladorOdds (seed fija)
+  - replay: respuestas grabadas con ODDS_GRABAR_DIR (api_odds_cliente),
+    servidas en el mismo orden, con su status y sus cabeceras de cuota;
+    así se puede repetir exactamente un día malo de producción
+Inyección de fallos: latencia (+ jitter), tasa de errores 5xx y 429 cuando
+se superan --max-rps peticiones por segundo.
+
+Uso:
+  python servidor_odds_local.py --puerto 8765 --deportes 20 --eventos 30 --latencia-ms 120 --max-rps 5
+  python servidor_odds_local.py --modo replay --dir grabaciones/
+y en el bot: ODDS_BASE_URL=http://127.0.0.1:8765/v4 (todos los api_odds*
+pasan por api_odds_cliente, que lee ese BASE_URL).
+"""
+import argparse, datetime, gzip, json, os, random, re, threading, time
+from collections import deque, defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+from simulacion import SimuladorOdds
+
+_RUTA_ODDS = re.compile(r"^/sports/([^/]+)/odds$")
+# parámetros que cambian en cada scan y no identifican la petición grabada
+_PARAMS_VOLATILES = {"apiKey", "commenceTimeFrom", "commenceTimeTo"}
+
+
+def _ruta(path):
+    """'/v4/sports/x/odds/' -> '/sports/x/odds'."""
+    p = "/" + path.strip("/")
+    if p.startswith("/v4/") or p == "/v4":
+        p = p[3:] or "/"
+    return p
+
+
+def _clave(ruta, params):
+    return ruta, tuple(sorted((k, v) for k, v in params.items() if k not in _PARAMS_VOLATILES))
+
+
+class FuenteSintetica:
+    def __init__(self, sim):
+        self.sim = sim
+
+    def responder(self, ruta, params):
+        """(status, cuerpo JSON serializable o bytes, cabeceras) o None si la ruta no existe."""
+        if ruta == "/sports":
+            return 200, self.sim.sports(), {}
+        m = _RUTA_ODDS.match(ruta)
+        if not m:
+            return None
+        sport = m.group(1)
+        if sport not in {s["key"] for s in self.sim.sports()}:
+            return 404, {"message": "Unknown sport. Check the sport key.", "error_code": "UNKNOWN_SPORT"}, {}
+        eventos = self.sim.odds(sport, params.get("regions", ""), params.get("markets") or "h2h")
+        desde, hasta = params.get("commenceTimeFrom"), params.get("commenceTimeTo")
+        if desde or hasta:
+            eventos = [e for e in eventos
+                       if (not desde or e["commence_time"] >= desde) and (not hasta or e["commence_time"] <= hasta)]
+        if params.get("oddsFormat") == "american":
+            for e in eventos:
+                for bm in e["bookmakers"]:
+                    for mk in bm["markets"]:
+                        for oc in mk["outcomes"]:
+                            d = oc["price"]
+                            oc["price"] = round((d - 1) * 100) if d >= 2 else round(-100 / (d - 1))
+        return 200, eventos, {}
+
+
+class FuenteReplay:
+    """
+    Sirve las grabaciones de un directorio (indice.jsonl + NNNNNN.json).
+    Cada petición repetida avanza a la siguiente grabación de esa misma
+    clave (ruta + params estables) y se queda en la última al agotarlas.
+    """
+
+    def __init__(self, directorio):
+        self.dir = directorio
+        self.por_clave = defaultdict(list)
+        self.por_ruta = defaultdict(list)
+        with open(os.path.join(directorio, "indice.jsonl")) as f:
+            for linea in f:
+                if not linea.strip():
+                    continue
+                g = json.loads(linea)
+                self.por_clave[_clave(g["ruta"], g["params"])].append(g)
+                self.por_ruta[g["ruta"]].append(g)
+        self.cursores = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def responder(self, ruta, params):
+        k = _clave(ruta, params)
+        lista = self.por_clave.get(k)
+        if not lista:
+            k, lista = ruta, self.por_ruta.get(ruta)  # mismo endpoint con otros mercados/regiones
+        if not lista:
+            if ruta == "/sports" or _RUTA_ODDS.match(ruta):
+                return 404, {"message": f"Sin grabación para {ruta}", "error_code": "NO_RECORDING"}, {}
+            return None
+        with self.lock:
+            i = self.cursores[k]
+            self.cursores[k] = min(i + 1, len(lista) - 1)
+        g = lista[i]
+        with open(os.path.join(self.dir, g["fichero"]), "rb") as f:
+            cuerpo = f.read()
+        return g["status"], cuerpo, dict(g.get("cabeceras", {}))
+
+
+class Estado:
+    """Configuración de fallos, cuota simulada y contadores del servidor."""
+
+    def __init__(self, fuente, quota=500, latencia_ms=0, jitter_ms=0, error_rate=0.0,
+                 max_rps=0, api_key=None, seed=0, verbose=False):
+        self.fuente = fuente
+        self.quota = quota
+        self.usados = 0
+        self.latencia = latencia_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.api_key = api_key
+        self.verbose = verbose
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.ventana = deque()
+        self.contadores = defaultdict(int)
+
+    def throttle(self):
+        """True si esta petición supera max_rps en el último segundo."""
+        if self.max_rps <= 0:
+            return False
+        with self.lock:
+            ahora = time.monotonic()
+            while self.ventana and ahora - self.ventana[0] > 1.0:
+                self.ventana.popleft()
+            if len(self.ventana) >= self.max_rps:
+                return True
+            self.ventana.append(ahora)
+            return False
+
+    def azar(self):
+        with self.lock:
+            return self.rng.random(), self.rng.random()
+
+    def cobrar(self, coste):
+        """Descuenta la cuota; False si no alcanza. Devuelve también las cabeceras."""
+        with self.lock:
+            if coste and self.quota - self.usados < coste:
+                ok = False
+            else:
+                self.usados += coste
+                ok = True
+            return ok, {"x-requests-remaining": str(max(0, self.quota - self.usados)),
+                        "x-requests-used": str(self.usados), "x-requests-last": str(coste if ok else 0)}
+
+
+def _coste(ruta, params):
+    if not _RUTA_ODDS.match(ruta):
+        return 0
+    mks = [m for m in params.get("markets", "h2h").split(",") if m]
+    regs = [r for r in params.get("regions", "").split(",") if r]
+    return max(1, len(mks)) * max(1, len(regs))
+
+
+class Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como la API real
+    estado = None  # lo fija crear_servidor
+
+    def log_message(self, fmt, *args):
+        if self.estado.verbose:
+            super().log_message(fmt, *args)
+
+    def _enviar(self, status, cuerpo, cabeceras=None):
+        if not isinstance(cuerpo, (bytes, bytearray)):
+            cuerpo = json.dumps(cuerpo).encode("utf-8")
+        gz = "gzip" in self.headers.get("Accept-Encoding", "")
+        if gz:
+            cuerpo = gzip.compress(cuerpo, 5)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if gz:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        for k, v in (cabeceras or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+        self.estado.contadores[status] += 1
+
+    def do_GET(self):
+        est = self.estado
+        url = urlsplit(self.path)
+        ruta = _ruta(url.path)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+
+        espera = est.latencia + (random.random() * est.jitter if est.jitter else 0.0)
+        if espera:
+            time.sleep(espera)
+        if est.throttle():
+            return self._enviar(429, {"message": "Too many requests (simulado)", "error_code": "EXCEEDED_FREQ_LIMIT"},
+                                {"Retry-After": "1"})
+        if est.api_key and params.get("apiKey") != est.api_key:
+            return self._enviar(401, {"message": "API key is not valid", "error_code": "INVALID_KEY"})
+        fallo, cual = est.azar()
+        if fallo < est.error_rate:
+            status = (500, 502, 503)[int(cual * 3)]
+            return self._enviar(status, {"message": f"Error simulado {status}"})
+
+        resp = est.fuente.responder(ruta, params)
+        if resp is None:
+            return self._enviar(404, {"message": "Not found"})
+        status, cuerpo, cabeceras = resp
+        if "x-requests-remaining" not in cabeceras:  # replay conserva la cuota grabada
+            coste = _coste(ruta, params) if status == 200 else 0
+            ok, cab_quota = est.cobrar(coste)
+            if not ok:
+                return self._enviar(401, {"message": "Usage quota has been reached.",
+                                          "error_code": "OUT_OF_USAGE_CREDITS"}, cab_quota)
+            cabeceras.update(cab_quota)
+        self._enviar(status, cuerpo, cabeceras)
+
+
+def crear_servidor(fuente, host="127.0.0.1", puerto=8765, **config):
+    """ThreadingHTTPServer listo para serve_forever() (p.ej. en un hilo, para benchmarks)."""
+    estado = Estado(fuente, **config)
+    manejador = type("ManejadorOdds", (Manejador,), {"estado": estado})
+    srv = ThreadingHTTPServer((host, puerto), manejador)
+    srv.daemon_threads = True
+    srv.estado = estado
+    return srv
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Servidor local compatible con The Odds API v4.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--puerto", type=int, default=8765)
+    ap.add_argument("--modo", choices=("sintetico", "replay"), default="sintetico")
+    ap.add_argument("--dir", help="directorio de grabaciones (modo replay)")
+    ap.add_argument("--deportes", type=int, default=10)
+    ap.add_argument("--eventos", type=int, default=20)
+    ap.add_argument("--casas", type=int, default=10)
+    ap.add_argument("--alternativas", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--quota", type=int, default=500, help="créditos iniciales simulados")
+    ap.add_argument("--latencia-ms", type=float, default=0)
+    ap.add_argument("--jitter-ms", type=float, default=0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 500/502/503")
+    ap.add_argument("--max-rps", type=float, default=0, help="peticiones/seg antes de responder 429 (0 = sin límite)")
+    ap.add_argument("--api-key", help="si se da, exige esta apiKey")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    if args.modo == "replay":
+        if not args.dir:
+            ap.error("--modo replay necesita --dir")
+        fuente = FuenteReplay(args.dir)
+    else:
+        fuente = FuenteSintetica(SimuladorOdds(args.deportes, args.eventos, args.casas,
+                                               n_alternativas=args.alternativas, seed=args.seed,
+                                               ahora=datetime.datetime.now(datetime.timezone.utc)))
+    srv = crear_servidor(fuente, args.host, args.puerto, quota=args.quota, latencia_ms=args.latencia_ms,
+                         jitter_ms=args.jitter_ms, error_rate=args.error_rate, max_rps=args.max_rps,
+                         api_key=args.api_key, seed=args.seed, verbose=args.verbose)
+    print(f"🛰️ Odds API local ({args.modo}) en http://{args.host}:{args.puerto}/v4")
+    print(f"   ODDS_BASE_URL=http://{args.host}:{args.puerto}/v4")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+        est = srv.estado
+        print(f"\n📊 Respuestas por status: {dict(est.contadores)} | créditos usados: {est.usados}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,14 @@
-import random
+import random, math, datetime, hashlib
 
 def simular_eventos(num_eventos=30):
     deportes = [
-        "Fútbol", "Tenis", "NBA", "NFL", "eSports", "Boxeo", 
+        "Fútbol", "Tenis", "NBA", "NFL", "eSports", "Boxeo",
         "MMA", "Hockey", "Béisbol", "Balonmano", "Ciclismo"
     ]
 
     mercados = [
         "Gana", "Over 2.5 goles", "Ambos marcan", "Hándicap -1.5", "Under 3.5 goles",
-        "Más de 5 tarjetas", "Menos de 10 córners", "Gana 2-0 sets", "Over 215.5 puntos", 
+        "Más de 5 tarjetas", "Menos de 10 córners", "Gana 2-0 sets", "Over 215.5 puntos",
         "1er tiempo - Empate", "Gana por decisión", "Más de 3 knockdowns"
     ]
 
@@ -26,3 +26,259 @@ def simular_eventos(num_eventos=30):
 
     return eventos
 
+
+# ========= Payloads sintéticos de The Odds API (v4) =========
+# Mismo formato que /sports y /sports/{key}/odds (oddsFormat=decimal), para
+# benchmarks y el servidor local sin gastar créditos. Todo es determinista a
+# partir de `seed`: misma configuración -> mismo JSON.
+
+# familias de deporte: (grupo, título, ¿empate en h2h?, línea total media, dispersión, paso de hándicap)
+FAMILIAS = {
+    "soccer": ("Soccer", "Liga", True, 2.5, 1.0, 0.25),
+    "basketball": ("Basketball", "Basket", False, 220.5, 12.0, 0.5),
+    "icehockey": ("Ice Hockey", "Hockey", False, 5.5, 1.2, 0.5),
+    "americanfootball": ("American Football", "Football", False, 45.5, 7.0, 0.5),
+    "baseball": ("Baseball", "Baseball", False, 8.5, 1.8, 0.5),
+    "tennis": ("Tennis", "Tenis", False, 22.5, 3.0, 0.5),
+}
+
+CASAS_REGION = {
+    "eu": ["Pinnacle", "Betsson", "Unibet", "Marathon Bet", "1xBet", "Betfair", "Nordic Bet", "Coolbet",
+           "Tipico", "Everygame", "Matchbook", "Suprabets", "GTbets", "Betclic"],
+    "uk": ["William Hill", "Ladbrokes", "Coral", "Sky Bet", "Paddy Power", "Betfred", "Bet Victor",
+           "Virgin Bet", "LiveScore Bet", "BoyleSports", "Casumo", "LeoVegas"],
+    "us": ["DraftKings", "FanDuel", "BetMGM", "Caesars", "BetRivers", "Bovada", "BetOnline.ag",
+           "LowVig.ag", "MyBookie.ag", "BetUS"],
+    "au": ["Sportsbet", "TAB", "Neds", "Ladbrokes AU", "PointsBet (AU)", "Unibet AU", "BetRight"],
+}
+
+P_LINEA_MIN = 0.03  # líneas de totals/spreads con una prob. menor (en cualquier lado) no se cotizan
+MERCADOS_SIM = ("h2h", "spreads", "totals", "btts", "draw_no_bet", "alternate_spreads", "alternate_totals")
+
+
+def _rng(seed, *partes):
+    """Random independiente y estable entre procesos para cada (seed, partes)."""
+    h = hashlib.sha256(repr((seed,) + partes).encode()).digest()
+    return random.Random(int.from_bytes(h[:8], "little"))
+
+
+def _iso(dt):
+    return dt.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def _cuota(p, margen, rng, ruido=0.015):
+    """Cuota decimal para prob. real p con el margen de la casa y algo de ruido."""
+    p_casa = min(0.97, max(0.02, p * (1.0 + margen) * (1.0 + rng.gauss(0.0, ruido))))
+    return round(max(1.02, 1.0 / p_casa), 2)
+
+
+def _normal_entera(ks, media, sd):
+    """Pesos de una normal discretizada sobre los enteros ks."""
+    return {k: math.exp(-0.5 * ((k - media) / sd) ** 2) for k in ks}
+
+
+def _dist_margen(p_home, p_away, media, sd):
+    """
+    P(margen local = k) sobre enteros, coherente con el h2h: P(k > 0) = p_home,
+    P(k < 0) = p_away y P(0) = el resto (0 en deportes sin empate). Dentro de
+    cada lado, normal discretizada alrededor de `media`.
+    """
+    lo, hi = min(-1, math.floor(media - 6 * sd)), max(1, math.ceil(media + 6 * sd))
+    dist = {0: max(0.0, 1.0 - p_home - p_away)}
+    for ks, p in ((range(1, hi + 1), p_home), (range(lo, 0), p_away)):
+        w = _normal_entera(ks, media, sd)
+        tot = sum(w.values()) or 1.0
+        dist.update({k: p * v / tot for k, v in w.items()})
+    return dist
+
+
+def _dist_total(media, sd):
+    """P(total = k) sobre enteros >= 0 (normal discretizada)."""
+    w = _normal_entera(range(max(0, math.floor(media - 6 * sd)), math.ceil(media + 6 * sd) + 1), media, sd)
+    tot = sum(w.values())
+    return {k: v / tot for k, v in w.items()}
+
+
+def _p_mas(dist, t):
+    """
+    Probabilidad "justa" de X > t (1/p es la cuota sin margen), contando el
+    push en líneas enteras y las dos mitades de las de cuarto. La de X < t es
+    1 - _p_mas(dist, t).
+    """
+    mitades = (t - 0.25, t + 0.25) if (4 * t) % 2 == 1 else (t,)
+    gana = push = 0.0
+    for h in mitades:
+        gana += sum(p for k, p in dist.items() if k > h)
+        push += dist.get(h, 0.0)
+    return gana / (len(mitades) - push)
+
+
+def generar_sports(n_deportes=10, seed=0, familias=None):
+    """Lista /sports: n_deportes activos repartidos entre las familias."""
+    familias = list(familias or FAMILIAS)
+    out = []
+    for i in range(n_deportes):
+        fam = familias[i % len(familias)]
+        grupo, titulo, *_ = FAMILIAS[fam]
+        n = i // len(familias)
+        out.append({
+            "key": f"{fam}_sim_{n}",
+            "group": grupo,
+            "title": f"{titulo} Sim {n}",
+            "description": f"{titulo} simulada {n} (seed {seed})",
+            "active": True,
+            "has_outrights": False,
+        })
+    return out
+
+
+def generar_odds(sport_key, n_eventos=20, n_casas=8, mercados=MERCADOS_SIM, n_alternativas=3,
+                 regiones=("eu", "uk"), seed=0, ahora=None, outliers=0.02, sport_title=None):
+    """
+    Respuesta /sports/{sport_key}/odds con n_eventos partidos y hasta n_casas
+    casas de `regiones`. Cada evento tiene probabilidades "reales" y cada
+    casa su margen (2-8%) y ruido; una fracción `outliers` de las cuotas sale
+    desajustada (casa rezagada) para que haya value bets y surebets.
+    Spreads y totals salen de distribuciones enteras del margen y del total
+    (con push en líneas enteras y de cuarto), coherentes con el h2h.
+    n_alternativas = líneas alternativas a cada lado de la principal.
+    """
+    fam = sport_key.split("_")[0]
+    _, titulo, con_empate, total_medio, total_sd, paso = FAMILIAS.get(fam, FAMILIAS["soccer"])
+    ahora = ahora or datetime.datetime.now(datetime.timezone.utc)
+    mercados = [m for m in mercados if con_empate or m not in ("btts", "draw_no_bet")]
+
+    casas = [c for r in regiones for c in CASAS_REGION.get(r, [])][:n_casas]
+    rng_casas = _rng(seed, sport_key, "casas")
+    margenes = {c: rng_casas.uniform(0.02, 0.08) for c in casas}
+
+    eventos = []
+    for e in range(n_eventos):
+        r = _rng(seed, sport_key, e)
+        home, away = f"{titulo} Home {e}", f"{titulo} Away {e}"
+        inicio = ahora + datetime.timedelta(hours=2 + e * 3 + r.randint(0, 2))
+
+        # "verdad" del evento
+        fuerza = r.gauss(0.0, 0.6)
+        if con_empate:
+            p_draw = r.uniform(0.22, 0.30)
+            p_home = (1 - p_draw) / (1 + math.exp(-fuerza - 0.2))
+            p_away = 1 - p_draw - p_home
+        else:
+            p_draw = 0.0
+            p_home = 1 / (1 + math.exp(-fuerza - 0.1))
+            p_away = 1 - p_home
+        media = total_medio + r.gauss(0.0, total_sd / 2)
+        linea_tot = round(media / 0.5) * 0.5 if paso >= 0.5 else round(media * 4) / 4
+        hcp = round(-fuerza * total_sd / paso) * paso  # hándicap del local (negativo = favorito)
+        p_btts = r.uniform(0.4, 0.65)
+        # distribuciones enteras del margen (coherente con p_home/p_draw) y del total:
+        # spreads/totals salen de ellas, así que no hay arbitrajes entre mercados en la "verdad"
+        margen = _dist_margen(p_home, p_away, -hcp, total_sd)
+        total = _dist_total(media, total_sd)
+        p_lineas = {}
+
+        def p_linea(dist, t):
+            k = (dist is margen, t)
+            if k not in p_lineas:
+                p_lineas[k] = _p_mas(dist, t)
+            return p_lineas[k]
+
+        bookmakers = []
+        for casa in casas:
+            rb = _rng(seed, sport_key, e, casa)
+            mg = margenes[casa]
+            last = _iso(ahora - datetime.timedelta(seconds=rb.randint(5, 600)))
+
+            def cu(p):
+                if rb.random() < outliers:  # casa que no ha seguido el mercado: prob. desfasada en log-odds
+                    p = 1.0 / (1.0 + math.exp(rb.uniform(0.05, 0.2) - math.log(p / (1.0 - p))))
+                return _cuota(p, mg, rb)
+
+            mks = []
+            for mk in mercados:
+                if mk == "h2h":
+                    outs = [{"name": home, "price": cu(p_home)}, {"name": away, "price": cu(p_away)}]
+                    if con_empate:
+                        outs.append({"name": "Draw", "price": cu(p_draw)})
+                elif mk in ("totals", "alternate_totals"):
+                    lineas = [linea_tot] if mk == "totals" else [
+                        linea_tot + k * max(paso, 0.5) for k in range(-n_alternativas, n_alternativas + 1) if k]
+                    outs = []
+                    for L in lineas:
+                        po = p_linea(total, L)
+                        if not P_LINEA_MIN <= po <= 1 - P_LINEA_MIN:
+                            continue  # línea casi segura: las casas no la ofrecen
+                        outs += [{"name": "Over", "price": cu(po), "point": L},
+                                 {"name": "Under", "price": cu(1 - po), "point": L}]
+                elif mk in ("spreads", "alternate_spreads"):
+                    lineas = [hcp] if mk == "spreads" else [
+                        hcp + k * paso * 2 for k in range(-n_alternativas, n_alternativas + 1) if k]
+                    outs = []
+                    for L in lineas:
+                        ph = p_linea(margen, -L)  # local L cubre si margen > -L
+                        if not P_LINEA_MIN <= ph <= 1 - P_LINEA_MIN:
+                            continue
+                        outs += [{"name": home, "price": cu(ph), "point": L},
+                                 {"name": away, "price": cu(1 - ph), "point": -L}]
+                elif mk == "btts":
+                    outs = [{"name": "Yes", "price": cu(p_btts)}, {"name": "No", "price": cu(1 - p_btts)}]
+                elif mk == "draw_no_bet":
+                    q = p_home / (p_home + p_away)
+                    outs = [{"name": home, "price": cu(q)}, {"name": away, "price": cu(1 - q)}]
+                else:
+                    continue
+                if outs:
+                    mks.append({"key": mk, "last_update": last, "outcomes": outs})
+
+            bookmakers.append({
+                "key": casa.lower().replace(" ", "_").replace(".", "").replace("(", "").replace(")", ""),
+                "title": casa,
+                "last_update": last,
+                "markets": mks,
+            })
+
+        eventos.append({
+            "id": hashlib.md5(f"{seed}:{sport_key}:{e}".encode()).hexdigest(),
+            "sport_key": sport_key,
+            "sport_title": sport_title or titulo,
+            "commence_time": _iso(inicio),
+            "home_team": home,
+            "away_team": away,
+            "bookmakers": bookmakers,
+        })
+    return eventos
+
+
+class SimuladorOdds:
+    """
+    Configuración de un "mundo" sintético: /sports y /odds coherentes entre
+    sí y reproducibles. `ahora` fija las horas de inicio (por defecto, al
+    crear el simulador) para que dos llamadas den exactamente el mismo JSON.
+    """
+
+    def __init__(self, n_deportes=10, n_eventos=20, n_casas=8, mercados=MERCADOS_SIM,
+                 n_alternativas=3, seed=0, ahora=None, outliers=0.02):
+        self.n_deportes = n_deportes
+        self.n_eventos = n_eventos
+        self.n_casas = n_casas
+        self.mercados = tuple(mercados)
+        self.n_alternativas = n_alternativas
+        self.seed = seed
+        self.ahora = ahora or datetime.datetime.now(datetime.timezone.utc)
+        self.outliers = outliers
+        self._sports = generar_sports(n_deportes, seed)
+        self._titulos = {s["key"]: s["title"] for s in self._sports}
+
+    def sports(self):
+        return self._sports
+
+    def odds(self, sport_key, regions="eu,uk", markets=None):
+        """Como GET /sports/{key}/odds: solo las regiones y mercados pedidos."""
+        if sport_key not in self._titulos:
+            return []
+        regiones = [r for r in str(regions).split(",") if r] or ["eu"]
+        pedidos = [m for m in str(markets).split(",") if m] if markets else self.mercados
+        mercados = [m for m in self.mercados if m in pedidos]
+        return generar_odds(sport_key, self.n_eventos, self.n_casas, mercados, self.n_alternativas,
+                            regiones, self.seed, self.ahora, self.outliers, self._titulos[sport_key])
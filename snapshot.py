@@ -0,0 +1,143 @@
+# snapshot.py
+"""
+Snapshot binario y versionado de un scan.
+
+Formato (little endian):
+  cabecera : MAGIC(6) | version u16 | ts f64 (epoch) | n_secciones u16
+  índice   : por sección -> len_nombre u8 | nombre utf-8 | offset u64 | tamaño u64
+  datos    : cada sección es un pickle comprimido con zlib
+
+- Se escribe en un fichero temporal del mismo directorio, fsync y os.replace:
+  un lector nunca ve un fichero a medias.
+- Escritor permite añadir las secciones de una en una (p.ej. un deporte
+  cada vez): solo se retienen los bytes comprimidos hasta cerrar().
+- Se lee con mmap y cada sección se descomprime solo cuando se pide, así que
+  comprobar la edad o cargar una sola sección no toca el resto del fichero.
+  Quien abre un Snapshot lo cierra (close() o `with`) al terminar de leerlo.
+- pickle conserva las claves tupla de groups_2way/groups_3way. Solo se
+  cargan snapshots escritos por este mismo proceso/bot, nunca ficheros ajenos.
+"""
+import os, mmap, pickle, struct, tempfile, time, zlib
+from collections.abc import Mapping
+
+MAGIC = b"BBSNAP"
+VERSION = 1
+NIVEL_ZLIB = 6
+
+_CAB = struct.Struct("<6sHdH")
+_SEC = struct.Struct("<QQ")
+
+
+class Escritor:
+    """
+    Snapshot por secciones: cada objeto se serializa y comprime al añadirlo
+    (el llamante puede soltarlo ya) y cerrar() escribe el fichero.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._datos = []
+
+    def agregar(self, nombre, obj):
+        self._datos.append((nombre.encode("utf-8"),
+                            zlib.compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), NIVEL_ZLIB)))
+
+    def cerrar(self, ts=None):
+        """Escribe el fichero de forma atómica. Devuelve el tamaño en bytes."""
+        ts = time.time() if ts is None else ts
+        datos = self._datos
+        indice_len = sum(1 + len(n) + _SEC.size for n, _ in datos)
+        offset = _CAB.size + indice_len
+        cab = [_CAB.pack(MAGIC, VERSION, ts, len(datos))]
+        for n, blob in datos:
+            cab.append(struct.pack("<B", len(n)) + n + _SEC.pack(offset, len(blob)))
+            offset += len(blob)
+
+        dir_ = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix=".snap-", dir=dir_)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(b"".join(cab))
+                for _, blob in datos:
+                    f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            try: os.unlink(tmp)
+            except OSError: pass
+            raise
+        self._datos = []
+        return offset
+
+
+def guardar(path, secciones, ts=None):
+    """Escribe {nombre: objeto} de forma atómica. Devuelve el tamaño en bytes."""
+    esc = Escritor(path)
+    for n, obj in secciones.items():
+        esc.agregar(n, obj)
+    return esc.cerrar(ts)
+
+
+class Snapshot(Mapping):
+    """Vista perezosa de un snapshot: snap.ts, snap["groups_2way"], ..."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.ts, n = _CAB.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"snapshot incompatible: {magic!r} v{version}")
+        self._indice = {}
+        pos = _CAB.size
+        for _ in range(n):
+            ln = self._mm[pos]; pos += 1
+            nombre = self._mm[pos:pos + ln].decode("utf-8"); pos += ln
+            self._indice[nombre] = _SEC.unpack_from(self._mm, pos); pos += _SEC.size
+        self._cargadas = {}
+
+    def edad(self):
+        return time.time() - self.ts
+
+    def close(self):
+        """Libera el mmap (las secciones ya cargadas siguen disponibles)."""
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, nombre):
+        if nombre not in self._cargadas:
+            self._cargadas[nombre] = self.leer(nombre)
+        return self._cargadas[nombre]
+
+    def leer(self, nombre):
+        """Como snap[nombre] pero sin quedarse la sección en memoria."""
+        if nombre in self._cargadas:
+            return self._cargadas[nombre]
+        off, size = self._indice[nombre]
+        return pickle.loads(zlib.decompress(self._mm[off:off + size]))
+
+    def __iter__(self):
+        return iter(self._indice)
+
+    def __len__(self):
+        return len(self._indice)
+
+
+def abrir(path, max_age=None):
+    """Snapshot o None si no existe, está corrupto/obsoleto o supera max_age (seg)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        snap = Snapshot(path)
+    except Exception:
+        return None
+    if max_age is not None and snap.edad() > max_age:
+        snap.close()
+        return None
+    return snap
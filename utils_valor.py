@@ -1,38 +1,49 @@
 # utils_valor.py
 from statistics import mean
+from functools import lru_cache
 import datetime
 
-# ========= Utilidades de formato (Markdown + fechas) =========
-MD_ESC_CHARS = ("\\","","*","[","]","(",")","~","`",">","#","+","-","=","|","{","}","",".","!")
+# ========= Utilidades de formato (MarkdownV2 + fechas) =========
+
+# caracteres reservados de MarkdownV2 (fuera de entidades), barra incluida
+MD_ESC_CHARS = "\\_*[]()~`>#+-=|{}.!"
+_MD_ESC = str.maketrans({ch: "\\" + ch for ch in MD_ESC_CHARS})
 
 def esc_md(s: str) -> str:
-    s = str(s)
-    for ch in _MD_ESC_CHARS:
-        s = s.replace(ch, f"\\{ch}")
-    return s
+    """Escapa para MarkdownV2 en una sola pasada (str.translate)."""
+    return str(s).translate(_MD_ESC)
 
 try:
     from zoneinfo import ZoneInfo  # Python 3.9+
 except Exception:
     ZoneInfo = None
 
+_MESES = ("Ene","Feb","Mar","Abr","May","Jun","Jul","Ago","Sep","Oct","Nov","Dic")
+
+@lru_cache(maxsize=None)
+def _zona(tz_name):
+    return ZoneInfo(tz_name) if ZoneInfo else None
+
+@lru_cache(maxsize=8192)
+def _fmt_hora_iso(h, tz_name):
+    try:
+        dt = datetime.datetime.fromisoformat(h.replace("Z", "+00:00"))
+        tz = _zona(tz_name)
+        if tz:
+            dt = dt.astimezone(tz)
+        return f"{dt.day:02d} {_MESES[dt.month - 1]} {dt.year} · {dt:%H:%M}"
+    except Exception:
+        return h
+
 def fmt_hora(h, tz_name: str = "Europe/Madrid") -> str:
     """
     Convierte ISO '2025-08-16T22:00:00+00:00' (o con 'Z') a '16 Ago 2025 · 00:00'
-    en la zona indicada. Si falla, devuelve el valor tal cual.
+    en la zona indicada. Si falla, devuelve el valor tal cual. Memoizado: los
+    picks de un mismo evento comparten hora.
     """
-    try:
-        if not isinstance(h, str):
-            return str(h)
-        iso = h.replace("Z", "+00:00")
-        dt = datetime.datetime.fromisoformat(iso)
-        if ZoneInfo:
-            dt = dt.astimezone(ZoneInfo(tz_name))
-        meses = ["Ene","Feb","Mar","Abr","May","Jun","Jul","Ago","Sep","Oct","Nov","Dic"]
-        mes_txt = meses[dt.month - 1]
-        return f"{dt.day:02d} {mes_txt} {dt.year} · {dt:%H:%M}"
-    except Exception:
+    if not isinstance(h, str):
         return str(h)
+    return _fmt_hora_iso(h, tz_name)
 
 # ========= Cálculo de probabilidades justas y edge =========
 def implied_prob(odds: float) -> float:
@@ -0,0 +1,101 @@
+# vistas_odds.py
+"""
+Vistas derivadas del scan único de api_odds_ext.
+
+Hay una sola ingesta (api_odds_ext.iter_scan: una llamada /odds por deporte,
+un snapshot, un TTL) y todo lo demás se calcula sobre sus grupos
+cuotas_compactas.Grupo sin volver a pedir nada a la API:
+  - iter_cuotas:      cuotas normalizadas una a una
+  - grupos_outcomes:  grupos 2/3 vías como {"meta", "outcomes"} (api_odds)
+  - selecciones:      mejor precio + consenso por selección (api_odds_secundarios)
+  - cuotas_planas:    una selección por cuota y casa (api_odds_profesional)
+`scan` es el dict {"groups_2way", "groups_3way"} de scan_all_markets();
+`mercados` (opcional) limita los tipos de mercado.
+"""
+import datetime
+from itertools import chain
+
+from normalizacion import linea_seleccion
+
+
+def _grupos(scan, mercados=None):
+    for g in chain(scan["groups_3way"].values(), scan["groups_2way"].values()):
+        if mercados is None or g.mercado in mercados:
+            yield g
+
+
+def _meta(g):
+    return {**g.meta, "linea": g.linea}
+
+
+def iter_cuotas(scan, mercados=None):
+    """(grupo, nombre_outcome, cuota, casa) por cada cuota del scan."""
+    for g in _grupos(scan, mercados):
+        for i, lado in enumerate(g.lados):
+            if not lado:
+                continue
+            nombre = g.nombre(i)
+            for precio, casa in lado:
+                yield g, nombre, precio, casa
+
+
+def grupos_outcomes(scan, mercados=None):
+    """Lista de {"meta", "outcomes": {nombre: [(cuota, casa), ...]}} con todas las cuotas por outcome."""
+    grupos = []
+    for g in _grupos(scan, mercados):
+        outcomes = {g.nombre(i): list(lado) for i, lado in enumerate(g.lados) if lado}
+        if outcomes:
+            grupos.append({"meta": _meta(g), "outcomes": outcomes})
+    return grupos
+
+
+def selecciones(scan, mercados=None):
+    """
+    Una entrada por selección (evento, mercado, línea, outcome) con la mejor
+    cuota, su casa y el consenso = media de 1/cuota de esa selección.
+    """
+    out = []
+    for g in _grupos(scan, mercados):
+        for i, lado in enumerate(g.lados):
+            if not lado:
+                continue
+            # max() se queda con la primera casa que da el mejor precio
+            j = max(range(len(lado)), key=lado.precios.__getitem__)
+            best = lado.precios[j]
+            p_consenso = sum(1.0 / p for p in lado.precios) / len(lado)
+            out.append({
+                "deporte": g.ev.deporte,
+                "evento": g.ev.evento,
+                "equipo": g.nombre(i),
+                "mercado": g.mercado,
+                "linea": linea_seleccion(g.mercado, g.linea, g.nombre(i), g.ev.home),
+                "cuota": round(best, 3),
+                "casa": lado.tabla.nombres[lado.casas[j]],
+                "probabilidad": round(p_consenso * 100, 2),
+                "ve": round(best * p_consenso, 3),
+                "hora": g.ev.hora,
+            })
+    return out
+
+
+def cuotas_planas(scan, mercados=None):
+    """Una entrada por cuota y casa, con la probabilidad implícita de esa cuota."""
+    horas = {}
+    out = []
+    for g, nombre, precio, casa in iter_cuotas(scan, mercados):
+        hora = horas.get(g.ev.hora)
+        if hora is None:
+            hora = horas[g.ev.hora] = datetime.datetime.fromisoformat(g.ev.hora).strftime("%a %d %b - %H:%M")
+        prob = round((1 / precio) * 100, 2)
+        out.append({
+            "deporte": g.ev.deporte,
+            "evento": g.ev.evento,
+            "equipo": nombre,
+            "cuota": precio,
+            "casa": casa,
+            "probabilidad": prob,
+            "ve": round(precio * (prob / 100), 2),
+            "hora": hora,
+            "mercado": g.mercado,
+        })
+    return out